@@ -7,6 +7,8 @@ Date created: 14/04/2020
 import sys, os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from aux_.pyaux import *
+from trace_io import *
+from headless import *
 
 import numpy as np, pandas as pd
 import matplotlib.pyplot as plt
@@ -15,13 +17,18 @@ import matplotlib.cm as cm
 __all__ = []
 
 def main(argv):
+    ana = load_analyser()
+    ana.start()
+# End of function `main`
+
+def load_analyser():
     simtrace_dir = os.path.join(os.path.dirname(__file__), 'simtrace')
-    event_df = pd.read_csv(os.path.join(simtrace_dir, 'events.csv'))
-    pkt_df = pd.read_csv(os.path.join(simtrace_dir, 'packets.csv'))
-    app_df = pd.read_csv(os.path.join(simtrace_dir, 'apps.csv'))
+    event_df = read_trace(os.path.join(simtrace_dir, 'events'))
+    pkt_df = read_trace(os.path.join(simtrace_dir, 'packets'))
+    app_df = read_trace(os.path.join(simtrace_dir, 'apps'))
 
-    ana = Analyser(event_df, pkt_df, app_df)
-    ana.start()
+    return Analyser(event_df, pkt_df, app_df)
+# End of function `load_analyser`
 
 class Analyser:
     def __init__(self, event_df, pkt_df, app_df):
@@ -48,7 +55,7 @@ class Analyser:
         bins = np.arange(0, t_last, t_res)
         x = bins[1:] - 0.5*t_res
 
-        grb = self.event_df.groupby(['type', 'app id'])
+        grb = self.event_df.groupby(['type', 'app id'], observed=True)
 
         hist_df = grb['timestamp (s)'].apply(lambda e: (x, np.histogram(e, bins)[0]/t_res))
 
@@ -66,7 +73,7 @@ class Analyser:
         bins = np.arange(0, t_last, t_res)
         x = bins[1:] - 0.5*t_res
 
-        grb = self.event_df.groupby(['type', 'app id'])
+        grb = self.event_df.groupby(['type', 'app id'], observed=True)
 
         hist_df = grb.apply(lambda arg_df: (x, np.histogram(arg_df['timestamp (s)'], bins, weights=arg_df['size (bytes)']*8.)[0]/t_res))
 
@@ -76,6 +83,9 @@ class Analyser:
     # End of method `arvl_bit_rate_plot`
 
 def t_res_query():
+    if (t_res:=get_batch_answer('t_res')) is not None:
+        return t_res
+
     print()
     while True:
         sel = input(f"Please enter time resolution in milliseconds? >    ").strip()
@@ -122,7 +132,7 @@ def ctrl_ts_plot(arvl_app_dat, dprt_app_dat, xlabel, ylabel):
     a_ax.set_ylim(y_lb.min(), y_ub.max())
     d_ax.set_ylim(y_lb.min(), y_ub.max())
 
-    plt.show()
+    show_figures()
 # End of function `ctrl_ts_plot`
 
 def queryPrompt(options):
@@ -7,29 +7,39 @@ Date created: 14/04/2020
 import sys, os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from aux_.pyaux import *
+from trace_io import *
+from headless import *
+from binning import *
 
 import numpy as np, pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as tckr
 import matplotlib.cm as cm
 from matplotlib.widgets import CheckButtons, RadioButtons
+from aux_.pyaux import MyRadioButtons
 
 __all__ = []
 rng = np.random.default_rng()
 cmaps = [cm.viridis, cm.plasma, cm.inferno, cm.magma]
 
 def main(argv):
+    ana = load_analyser()
+    ana.start()
+# End of function `main`
+
+def load_analyser():
     simtrace_dir = os.path.join(os.path.dirname(__file__), 'simtrace')
-    event_df = pd.read_csv(os.path.join(simtrace_dir, 'events.csv'))
-    pkt_df = pd.read_csv(os.path.join(simtrace_dir, 'packets.csv'))
+    event_df = read_trace(os.path.join(simtrace_dir, 'events'))
+    pkt_df = read_trace(os.path.join(simtrace_dir, 'packets'))
 
-    ana = Analyser(event_df, pkt_df)
-    ana.start()
+    return Analyser(event_df, pkt_df)
+# End of function `load_analyser`
 
 class Analyser:
     def __init__(self, event_df, pkt_df):
         self.event_df = event_df
         self.pkt_df = pkt_df
+        self.binner = None
         self.options = (('Inter-arrival time histogram', self.iat_hist),
                         ('Arrival number histogram', self.arvl_hist),
                         ('Service duration histogram', self.sd_hist),
@@ -72,9 +82,20 @@ class Analyser:
                       bins=np.arange(sys_states.max() + 2))
     # End of method `sys_state_hist`
 
+    def get_srv_states(self):
+        '''
+        Busy (1) or idle (0) state of every server after every event
+        '''
+        if srv_cols:=[col for col in self.event_df.columns if col.startswith('server ') and col.endswith(' busy')]:
+            return self.event_df[srv_cols].to_numpy()
+
+        # Traces of a single server don't need to tell
+        return (self.event_df['system state'].to_numpy() > 0)[:, None].astype(int)
+    # End of method `get_srv_states`
+
     def q_len_plot(self):
         sys_states = self.event_df['system state']
-        q_lens = np.clip(sys_states - 1, 0, None)
+        q_lens = sys_states - self.get_srv_states().sum(axis=1)
         tt = self.event_df['timestamp (s)']
 
         ctrl_ts_plot(tt, q_lens, 'Time (s)', 'Queue length', 'step')
@@ -82,7 +103,7 @@ class Analyser:
 
     def q_len_hist(self):
         sys_states = self.event_df['system state']
-        q_lens = np.clip(sys_states - 1, 0, None)
+        q_lens = sys_states - self.get_srv_states().sum(axis=1)
         tt = self.event_df['timestamp (s)']
         
         ctrl_hist_dur(data=np.append(0, q_lens[:-1]),
@@ -117,11 +138,10 @@ class Analyser:
             return
         t_res *= 1E-3 # secs
 
-        tt = self.pkt_df['arrive (s)']
-        bins = np.arange(0, tt.iloc[-1], t_res)
-        pkt_rates = np.histogram(tt, bins)[0]/t_res
+        x, arvls = self.get_binner().get_series(t_res)[0]
+        pkt_rates = arvls/t_res
 
-        ctrl_ts_plot(bins[1:] - 0.5*t_res, pkt_rates, 'Time (s)', 'Packet rate (pps)')
+        ctrl_ts_plot(x, pkt_rates, 'Time (s)', 'Packet rate (pps)')
     # End of method `arvl_pkt_rate_plot`
 
     def arvl_bit_rate_plot(self):
@@ -129,19 +149,45 @@ class Analyser:
             return
         t_res *= 1E-3 # secs
 
-        tt, pkt_sizes = self.pkt_df['arrive (s)'], self.pkt_df['size (bytes)']*8.
-        bins = np.arange(0, tt.iloc[-1], t_res)
-        thruput = np.histogram(tt, bins, weights=pkt_sizes)[0]/t_res
+        x, arvlbytes = self.get_binner().get_series(t_res, 'size (bytes)')[0]
+        thruput = arvlbytes*(8./t_res)
 
-        ctrl_ts_plot(bins[1:] - 0.5*t_res, thruput, 'Time (s)', 'Throughput (bps)')
+        ctrl_ts_plot(x, thruput, 'Time (s)', 'Throughput (bps)')
     # End of method `arvl_bit_rate_plot`
 
+    def get_binner(self):
+        '''
+        Binner of the packets by arrival time, made on first use
+        '''
+        if self.binner is None: self.binner = TimeBinner(self.pkt_df, 'arrive (s)')
+        return self.binner
+    # End of method `get_binner`
+
     def srv_state_plot(self):
-        sys_states = self.event_df['system state']
-        tt = self.event_df['timestamp (s)']
-        srv_busy = (sys_states>0)
+        srv_states = self.get_srv_states()
+        tt = self.event_df['timestamp (s)'].to_numpy()
+
+        # Time average of the busy state, i.e. utilisation
+        utils = (np.vstack((np.zeros(srv_states.shape[1]), srv_states[:-1]))*np.diff(tt, prepend=0.)[:, None]).sum(axis=0)/tt[-1]
+        for srv_id, util in enumerate(utils):
+            print(f'Server {srv_id} utilisation: {util:.1%}')
 
-        ctrl_ts_plot(tt, srv_busy, 'Time (s)', 'Server state', 'step', yticks=([0,1], ['idle', 'busy']))
+        if srv_states.shape[1] == 1:
+            ctrl_ts_plot(tt, srv_states[:, 0], 'Time (s)', 'Server state', 'step', yticks=([0,1], ['idle', 'busy']))
+            return
+
+        fig, axes = plt.subplots(srv_states.shape[1], 1, sharex=True, squeeze=False)
+        cmap = rng.choice(cmaps)
+
+        for srv_id, ax in enumerate(axes[:, 0]):
+            ax.step(tt, srv_states[:, srv_id], where='post', color=cmap(rng.random()))
+            ax.set_yticks([0, 1], ['idle', 'busy'])
+            ax.set_ylabel(f'Server {srv_id}\n({utils[srv_id]:.0%})')
+            ax.grid(True)
+
+        axes[-1, 0].set_xlabel('Time (s)')
+
+        show_figures()
     # End of method `srv_state_plot`
 
     def iat_hist(self):
@@ -159,9 +205,7 @@ class Analyser:
             return
         t_res *= 1E-3 # secs
 
-        tt = self.pkt_df['arrive (s)']
-        bins = np.arange(0, tt.iloc[-1], t_res)
-        arvls = np.histogram(tt, bins)[0]
+        arvls = self.get_binner().get_series(t_res)[0][1]
         hbins = np.arange(arvls.min(), arvls.max()+2)
 
         ctrl_hist(arvls, 'Arrivals', hbins, align='left', rwidth=0.5)
@@ -215,6 +259,9 @@ def queryPrompt(options):
 # End of function `queryPrompt`
 
 def t_res_query():
+    if (t_res:=get_batch_answer('t_res')) is not None:
+        return t_res
+
     print()
     while True:
         sel = input(f"Please enter time resolution in milliseconds? >    ").strip()
@@ -229,6 +276,9 @@ def t_res_query():
 # End of function `t_res_query`
 
 def byt_res_query():
+    if (byt_res:=get_batch_answer('byt_res')) is not None:
+        return byt_res
+
     print()
     while True:
         sel = input(f"Please enter packet size resolution in Bytes? >    ").strip()
@@ -309,11 +359,12 @@ def ctrl_ts_plot(x, y, xlabel, ylabel, typ=None, xticks=None, yticks=None):
     check1.on_clicked(lambda label: updateGraph(label, avg_line_ptr, check1.get_status()[0]))
     check2.on_clicked(lambda label: updateGraph(label, tavg_line_ptr, check2.get_status()[0]))
 
-    plt.show()
+    show_figures()
 
     print()
     while True:
-        sel = input(f"Would you like to save the data? (y/n)>    ").strip().lower()
+        if (sel:=get_batch_answer('save_data')) is None:
+            sel = input(f"Would you like to save the data? (y/n)>    ").strip().lower()
 
         if sel == 'y':
             
@@ -346,6 +397,11 @@ def ctrl_hist(data, xlabel, bins=None, align='mid', rwidth=None):
     ax = plt.gca()
     ax.set_axisbelow(True)
 
+    # Figures saved to files have no use for the buttons
+    if not is_interactive():
+        show_figures()
+        return
+
     plt.subplots_adjust(left=0.1, right=0.9, top=0.88, bottom=0.1)
 
     rax = plt.axes([0.3, 0.88, 0.55, 0.1])
@@ -371,7 +427,7 @@ def ctrl_hist(data, xlabel, bins=None, align='mid', rwidth=None):
 
     radBtn.on_clicked(updateGraph)
 
-    plt.show()
+    show_figures()
 # End of function `ctrl_hist`
 
 def ctrl_hist_dur(data, xlabel, durations, dur_name='Duration', bins=None, rwidth=.5):
@@ -388,6 +444,11 @@ def ctrl_hist_dur(data, xlabel, durations, dur_name='Duration', bins=None, rwidt
     ax = plt.gca()
     ax.set_axisbelow(True)
 
+    # Figures saved to files have no use for the buttons
+    if not is_interactive():
+        show_figures()
+        return
+
     plt.subplots_adjust(left=0.1, right=0.9, top=0.88, bottom=0.1)
 
     rax = plt.axes([0.25, 0.88, 0.55, 0.1])
@@ -417,7 +478,7 @@ def ctrl_hist_dur(data, xlabel, durations, dur_name='Duration', bins=None, rwidt
 
     radBtn.on_clicked(updateGraph)
 
-    plt.show()
+    show_figures()
 # End of function `ctrl_hist_dur`
 
 if __name__ == '__main__':
@@ -7,6 +7,9 @@ Date created: 14/04/2020
 import sys, os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from aux_.pyaux import *
+from trace_io import *
+from headless import *
+from binning import *
 
 import numpy as np, pandas as pd
 import matplotlib.pyplot as plt
@@ -20,15 +23,24 @@ rng = np.random.default_rng()
 cmaps = [cm.viridis, cm.plasma, cm.inferno, cm.magma]
 
 def main(argv):
+    ana = load_analyser()
+    ana.start()
+# End of function `main`
+
+def load_analyser():
     simtrace_dir = os.path.join(os.path.dirname(__file__), 'simtrace')
-    pkt_df = pd.read_csv(os.path.join(simtrace_dir, 'packets.csv'))
+    pkt_df = read_trace(os.path.join(simtrace_dir, 'packets'))
 
-    ana = Analyser(pkt_df)
-    ana.start()
+    return Analyser(pkt_df)
+# End of function `load_analyser`
 
 class Analyser:
     def __init__(self, pkt_df):
         self.pkt_df = pkt_df
+        self.binners = {}
+
+        # Traces from before runs were labelled: one run per BEP
+        if 'run' not in pkt_df: pkt_df['run'] = pkt_df['bep'].map('bep={:g}'.format).astype('category')
         self.options = (('Packet rate plot', self.pkt_rate_plot),
                         ('Throughput plot', self.thruput_plot),
                         ('Good packet rate plot', self.good_pkt_rate_plot),
@@ -37,6 +49,7 @@ class Analyser:
                         ('Goodput comparison', self.goodput_compare),
                         ('Packet survival probability', self.survl_probability),
                         ('Goodput confidence intervals', self.goodput_interval),
+                        ('ARQ goodput plot', self.arq_goodput_plot),
                       )
     # End of class constructor
 
@@ -49,9 +62,9 @@ class Analyser:
     
 
     def survl_probability(self):
-        # Group by bit error probability
-        surl_probs = self.pkt_df.groupby('bep')['faulty fast'].apply(lambda e: (~e).sum()/len(e))
-        cat_bar(surl_probs.index, surl_probs, 'Bit error probability', 'Packet survival probability')
+        # Group by run, i.e. bit error probability or channel
+        surl_probs = self.pkt_df.groupby('run', observed=True)['faulty fast'].apply(lambda e: (~e).sum()/len(e))
+        cat_bar(surl_probs.index, surl_probs, 'Run', 'Packet survival probability')
     # End of method `survl_probability`
 
     
@@ -60,24 +73,9 @@ class Analyser:
             return
         t_res *= 1E-3 # secs
 
-        def anonymous(df):
-            tt = df['arrive (s)']
-            bins = np.arange(0, df['arrive (s)'].iloc[-1], t_res)
-            
-            survl_grp1 = df.groupby('faulty fast').get_group(False)
-            survl_grp2 = df.groupby('faulty strforw').get_group(False)
-            
-            survls1, _ = np.histogram(survl_grp1['arrive (s)'], bins)
-            survls2, _ = np.histogram(survl_grp2['arrive (s)'], bins)
-
-            good_pkt_rates1 = survls1/t_res
-            good_pkt_rates2 = survls2/t_res
-
-            x = bins[1:] - 0.5*t_res
-
-            return pd.DataFrame({'Fast': good_pkt_rates1, 'Straightforward': good_pkt_rates2, 'x': x})
-
-        self.good_pkt_rates = self.pkt_df.groupby('bep').apply(anonymous).groupby('bep')
+        self.good_pkt_rates = self.get_binned(t_res, {  'Fast': ('arrive (s)', None, ('faulty fast', False)),
+                                                        'Straightforward': ('arrive (s)', None, ('faulty strforw', False))},
+                                                1./t_res)
         self.t_res = t_res
         return True
     # End of method `get_good_pkt_rate`
@@ -87,27 +85,70 @@ class Analyser:
             return
         t_res *= 1E-3 # secs
 
-        def anonymous(df):
-            tt = df['arrive (s)']
-            bins = np.arange(0, df['arrive (s)'].iloc[-1], t_res)
-            
-            survl_grp1 = df.groupby('faulty fast').get_group(False)
-            survl_grp2 = df.groupby('faulty strforw').get_group(False)
-            
-            survlbytes1, _ = np.histogram(survl_grp1['arrive (s)'], bins, weights=survl_grp1['size (bytes)'])
-            survlbytes2, _ = np.histogram(survl_grp2['arrive (s)'], bins, weights=survl_grp2['size (bytes)'])
-
-            goodputs1 = survlbytes1*(8./t_res)
-            goodputs2 = survlbytes2*(8./t_res)
+        self.goodputs = self.get_binned(t_res, {'Fast': ('arrive (s)', 'size (bytes)', ('faulty fast', False)),
+                                                'Straightforward': ('arrive (s)', 'size (bytes)', ('faulty strforw', False))},
+                                        8./t_res)
+        self.t_res = t_res
+        return True
+    # End of method `get_goodput`
 
-            x = bins[1:] - 0.5*t_res
+    def get_arq_goodput(self):
+        if 'attempts' not in self.pkt_df:
+            print('The trace has no retransmissions, simulate with ARQ on first.')
+            return
+        if not (t_res:=t_res_query()):
+            return
+        t_res *= 1E-3 # secs
 
-            return pd.DataFrame({'Fast': goodputs1, 'Straightforward': goodputs2, 'x':x})
+        # Without ARQ a good packet counts on arrival, with ARQ once it is
+        # delivered, lost packets arriving never
+        if 'deliver (s)' not in self.pkt_df:
+            self.pkt_df['deliver (s)'] = self.pkt_df['arrive (s)'] + self.pkt_df['delay (ms)']*1E-3
 
-        self.goodputs = self.pkt_df.groupby('bep').apply(anonymous).groupby('bep')
+        self.arq_goodputs = self.get_binned(t_res, {'Without ARQ': ('arrive (s)', 'size (bytes)', ('faulty fast', False)),
+                                                    'ARQ': ('deliver (s)', 'size (bytes)', None)},
+                                            8./t_res)
         self.t_res = t_res
         return True
-    # End of method `get_goodput`
+    # End of method `get_arq_goodput`
+
+    def arq_goodput_plot(self):
+        if not self.get_arq_goodput(): return
+
+        ctrl_ts_plot_multi(self.arq_goodputs, 'Time (s)', 'Goodput (bps)')
+    # End of method `arq_goodput_plot`
+
+    def get_binner(self, time_col):
+        '''
+        Binner of the packets by `time_col` per run, made on first use. All
+        of them bin up to the last arrival of every run.
+        '''
+        if time_col not in self.binners:
+            t_ends = self.get_binner('arrive (s)').t_ends if time_col != 'arrive (s)' else None
+            self.binners[time_col] = TimeBinner(self.pkt_df, time_col, 'run', t_ends)
+
+        return self.binners[time_col]
+    # End of method `get_binner`
+
+    def get_binned(self, t_res, SERIESs, scale=1., t_end=None):
+        '''
+        Series binned by `t_res` seconds per run, grouped by run, one column
+        per label of `SERIESs` (label --> (time column, weight column or None
+        to count, (column, value) filter or None)) and times `scale`, plus 'x'
+        '''
+        grp_COLs = {}
+        for label, (time_col, weight_col, where) in SERIESs.items():
+            binner = self.get_binner(time_col)
+
+            for run, (x, sums) in zip(binner.grp_VALs, binner.get_series(t_res, weight_col, where, t_end)):
+                grp_COLs.setdefault(run, {})[label] = sums*scale
+
+        # Every binner has the same bins, 'x' goes last for the plots
+        for run, x_sums in zip(binner.grp_VALs, binner.get_series(t_res, t_end=t_end)): grp_COLs[run]['x'] = x_sums[0]
+
+        # Runs in the order they were simulated
+        return pd.concat({run: pd.DataFrame(cols) for run, cols in grp_COLs.items()}, names=['run', None]).groupby('run', sort=False)
+    # End of method `get_binned`
 
     def goodput_interval(self):
         if not self.get_goodput(): return
@@ -118,8 +159,8 @@ class Analyser:
 
         ag_means = self.goodputs['Fast'].mean()
 
-        for bep in sampls.index:
-            sampl_df = pd.DataFrame.from_dict(dict(enumerate(sampls.loc[bep])), orient='index').T
+        for run in sampls.index:
+            sampl_df = pd.DataFrame.from_dict(dict(enumerate(sampls.loc[run])), orient='index').T
 
             counts = sampl_df.count()
             means = sampl_df.mean()
@@ -130,19 +171,19 @@ class Analyser:
             fig, ax = plt.subplots()
             ax.errorbar(sampl_df.columns, means, yerr=yerrs, fmt='o', c=rng.choice(cmaps)(rng.random()))
 
-            ax.hlines(ag_means.loc[bep], sampl_df.columns.min(), sampl_df.columns.max()+1, color='r', lw=2)
+            ax.hlines(ag_means.loc[run], sampl_df.columns.min(), sampl_df.columns.max()+1, color='r', lw=2)
 
             ax.set_xlabel('Sample')
             ax.set_ylabel('Goodput (bps)')
 
-            ax.set_title(f'BEP = {bep}')
+            ax.set_title(run)
             
             ax.xaxis.grid(False)
             ax.yaxis.grid(True)
             ax.set_axisbelow(True)
 
         plt.tight_layout()
-        plt.show()
+        show_figures()
     # End of method `goodput_interval`
 
     def pkt_rate_compare(self):
@@ -174,14 +215,13 @@ class Analyser:
         t_res *= 1E-3 # secs
 
         # Get only the first run
-        pkt_df = self.pkt_df.groupby('bep').get_group(self.pkt_df.loc[0, 'bep'])
+        binner = self.get_binner('arrive (s)')
+        grp_id = np.flatnonzero(binner.grp_VALs == self.pkt_df['run'].iloc[0])[0]
 
-        tt = pkt_df['arrive (s)']
-        bins = np.arange(0, tt.iloc[-1] + t_res, t_res)
-        arvls, _ = np.histogram(tt, bins)
+        x, arvls = binner.get_series(t_res, t_end=binner.t_ends[grp_id] + t_res)[grp_id]
         pkt_rates = arvls/t_res
 
-        ctrl_ts_plot(bins[1:] - 0.5*t_res, pkt_rates, 'Time (s)', 'Packet rate (pps)')
+        ctrl_ts_plot(x, pkt_rates, 'Time (s)', 'Packet rate (pps)')
     # End of method `arvl_pkt_rate_plot`
 
     def thruput_plot(self):
@@ -190,15 +230,13 @@ class Analyser:
         t_res *= 1E-3 # secs
 
         # Get only the first run
-        pkt_df = self.pkt_df.groupby('bep').get_group(self.pkt_df.loc[0, 'bep'])
+        binner = self.get_binner('arrive (s)')
+        grp_id = np.flatnonzero(binner.grp_VALs == self.pkt_df['run'].iloc[0])[0]
 
-        tt = pkt_df['arrive (s)']
-        
-        bins = np.arange(0, tt.iloc[-1] + t_res, t_res)
-        arvlbytes, _ = np.histogram(tt, bins, weights=pkt_df['size (bytes)'])
+        x, arvlbytes = binner.get_series(t_res, 'size (bytes)', t_end=binner.t_ends[grp_id] + t_res)[grp_id]
         thruputs = arvlbytes*(8./t_res)
 
-        ctrl_ts_plot(bins[1:] - 0.5*t_res, thruputs, 'Time (s)', 'Throughput (bps)')
+        ctrl_ts_plot(x, thruputs, 'Time (s)', 'Throughput (bps)')
     # End of method `arvl_bit_rate_plot`
 
 
@@ -227,6 +265,9 @@ def queryPrompt(options):
 # End of function `queryPrompt`
 
 def t_res_query():
+    if (t_res:=get_batch_answer('t_res')) is not None:
+        return t_res
+
     print()
     while True:
         sel = input(f"Please enter time resolution in milliseconds? >    ").strip()
@@ -241,6 +282,9 @@ def t_res_query():
 # End of function `t_res_query`
 
 def sampl_size_query():
+    if (sampl_sz:=get_batch_answer('sampl_sz')) is not None:
+        return sampl_sz
+
     print()
     while True:
         sel = input(f"Please enter the sample size? >    ").strip()
@@ -265,13 +309,13 @@ def ctrl_ts_plot(x, y, xlabel, ylabel):
 
     ax.grid(True)
     
-    plt.show()
+    show_figures()
 # End of function `ctrl_ts_plot`
 
 def ctrl_ts_plot_multi(grb, xlabel, ylabel):
 
-    for bep in grb.indices:
-        grp = grb.get_group(bep)
+    for run in grb.indices:
+        grp = grb.get_group(run)
 
         lab1, lab2, labx = grp.keys()
         y1, y2, x = grp[lab1], grp[lab2], grp[labx]
@@ -288,20 +332,20 @@ def ctrl_ts_plot_multi(grb, xlabel, ylabel):
         ax.legend()
         ax.grid(True)
 
-        ax.set_title(f'BEP = {bep}')
+        ax.set_title(run)
 
     plt.tight_layout()
-    plt.show()
+    show_figures()
 # End of function `ctrl_ts_plot_multi`
 
 def compare_plot(grb, ylabel):
 
-    for bep in grb.indices:
+    for run in grb.indices:
         cmap = rng.choice(cmaps)
 
         fig, ax = plt.subplots()
 
-        grp = grb.get_group(bep)
+        grp = grb.get_group(run)
 
         lab1, lab2, *_ = grp.keys()
         y1, y2 = grp[lab1], grp[lab2]
@@ -324,11 +368,11 @@ def compare_plot(grb, ylabel):
         ax.yaxis.grid(True)
         ax.set_axisbelow(True)
 
-        ax.set_title(f'BEP = {bep}')
+        ax.set_title(run)
 
     plt.tight_layout()
 
-    plt.show()
+    show_figures()
 # End of function `compare_plot`
 
 
@@ -347,7 +391,7 @@ def cat_bar(cats, ys, xlabel, ylabel):
     ax.yaxis.grid(True)
     ax.set_axisbelow(True)
     
-    plt.show()
+    show_figures()
 # End of function `cat_bar`
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+'''
+File name: analytic.py
+'''
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from functools import lru_cache
+from math import factorial
+from dscp_catalog import *
+from replicate import *
+import numpy as np
+import pandas as pd
+
+__all__ = ['solve_mmck', 'get_priority_waits', 'get_mm1_reference', 'get_pq_reference', 'compare_with_reference']
+
+# State probabilities of an unlimited system are cut where they fall below this
+TAIL_PROB = 1E-12
+
+def main():
+    from mm1 import MM1_Sim
+    from pq import DiffServ_Sim
+
+        # Feel free to modify the parameters below.
+    replication_num          = 16
+    seed                     = 0
+    relative_tolerance       = .05
+
+    mm1_kwargs = dict(  t_limit=60,
+                        q_cap=np.inf,
+                        mean_iat=1E-3,
+                        mean_pkt_size=100,      # Bytes
+                        out_rate=1E6)           # bps
+    mm1k_kwargs = {**mm1_kwargs, 'q_cap': 5}
+    pq_kwargs = dict(   t_limit=60,
+                        q_cap=np.inf,
+                        mean_IATs=[4E-3, 3E-3, 4E-3],
+                        mean_pkt_SIZEs=[100, 150, 100],
+                        DSCPs=[0x2e, 0x0a, 0x00],
+                        out_rate=1E6)
+
+    for title, sim_cls, sim_kwargs, ref in (('M/M/1', MM1_Sim, mm1_kwargs, get_mm1_reference(**without_t_limit(mm1_kwargs))),
+                                            ('M/M/1/K', MM1_Sim, mm1k_kwargs, get_mm1_reference(**without_t_limit(mm1k_kwargs))),
+                                            ('Priority M/G/1', DiffServ_Sim, pq_kwargs, get_pq_reference(**without_t_limit(pq_kwargs)))):
+        print(f'\n{title}: {replication_num} replications vs reference... ', end='', flush=True)
+        summary_df = run_replications(sim_cls, sim_kwargs, replication_num, seed=seed)
+        print('Done!\n')
+
+        compare_df = compare_with_reference(summary_df, ref, relative_tolerance)
+        print(compare_df.to_string())
+        print('PASSED' if compare_df['ok'].all() else 'FAILED')
+# End of function `main`
+
+def without_t_limit(sim_kwargs):
+    return {name: val for name, val in sim_kwargs.items() if name != 't_limit'}
+# End of function `without_t_limit`
+
+@lru_cache(maxsize=None)
+def solve_mmck(lamb, mu, srv_num=1, sys_cap=np.inf):
+    '''
+    Steady state of M/M/c/K: arrival rate `lamb`, service rate `mu` per
+    server, `srv_num` servers and room for `sys_cap` packets in the system.
+    Returns (state_probs, blocking_prob, mean_wait), the wait being that of
+    admitted packets. Closed forms for one server, the birth-death product
+    form otherwise. The state probabilities are read-only, they are cached.
+    '''
+    rho = lamb/(srv_num*mu)
+
+    if sys_cap == np.inf and rho >= 1.:
+        raise ValueError(f'Unstable system, utilisation {rho:g} >= 1 needs a finite capacity.')
+
+    if srv_num == 1 and sys_cap == np.inf:
+        # M/M/1, geometric
+        state_num = int(np.ceil(np.log(TAIL_PROB)/np.log(rho))) + 1 if rho > 0. else 1
+        state_probs = (1. - rho)*rho**np.arange(state_num)
+        mean_wait = rho/(mu - lamb)
+
+    elif srv_num == 1:
+        # M/M/1/K, truncated geometric
+        if rho == 1.: state_probs = np.full(int(sys_cap) + 1, 1./(sys_cap + 1))
+        else: state_probs = (1. - rho)*rho**np.arange(int(sys_cap) + 1)/(1. - rho**(sys_cap + 1))
+
+        mean_wait = None
+
+    else:
+        # Birth-death product form, p_n/p_0 = a^n/n! up to c servers, then times rho per packet
+        a = lamb/mu
+        if sys_cap < np.inf: state_num = int(sys_cap) + 1
+        else: state_num = srv_num + 1 + (int(np.ceil(np.log(TAIL_PROB)/np.log(rho))) if rho > 0. else 0)
+
+        ns = np.arange(state_num)
+        log_ratios = np.empty(state_num)
+        log_ratios[:srv_num+1] = [n*np.log(a) - np.log(factorial(n)) if a > 0. else (0. if n == 0 else -np.inf)
+                                        for n in ns[:srv_num+1]]
+        log_ratios[srv_num+1:] = log_ratios[srv_num] + (ns[srv_num+1:] - srv_num)*np.log(rho)
+
+        # Normalised in the log domain, a^n/n! overflows for many servers
+        state_probs = np.exp(log_ratios - log_ratios.max())
+        state_probs /= state_probs.sum()
+        mean_wait = None
+
+    blocking_prob = state_probs[-1] if sys_cap < np.inf else 0.
+
+    # Little's law on the queue, for the admitted packets
+    if mean_wait is None:
+        mean_q_len = (np.maximum(np.arange(len(state_probs)) - srv_num, 0)*state_probs).sum()
+        mean_wait = mean_q_len/(lamb*(1. - blocking_prob)) if lamb > 0. else 0.
+
+    state_probs.setflags(write=False)
+    return state_probs, blocking_prob, mean_wait
+# End of function `solve_mmck`
+
+@lru_cache(maxsize=None)
+def get_priority_waits(LAMBs, mean_SRVs, srv_2nd_MOMs):
+    '''
+    Mean waits of the classes of a non-preemptive priority M/G/1 queue
+    (Cobham), class 0 first: W_k = W_0/((1 - s_k-1)(1 - s_k)), s_k being the
+    load of classes 0 to k and W_0 the mean residual service. A class that
+    the ones above it leave no capacity to waits forever.
+    '''
+    LAMBs, mean_SRVs, srv_2nd_MOMs = np.array(LAMBs), np.array(mean_SRVs), np.array(srv_2nd_MOMs)
+
+    cum_rhos = np.cumsum(LAMBs*mean_SRVs)
+    prev_cum_rhos = np.hstack((0., cum_rhos[:-1]))
+    residual = (LAMBs*srv_2nd_MOMs).sum()/2.
+
+    with np.errstate(divide='ignore'):
+        waits = np.where(cum_rhos < 1., residual/((1. - prev_cum_rhos)*(1. - cum_rhos)), np.inf)
+
+    waits.setflags(write=False)
+    return waits
+# End of function `get_priority_waits`
+
+def get_pkt_size_moments(mean_pkt_size):
+    '''
+    Mean and second moment in Bytes of exponential packet sizes rounded up
+    to whole Bytes, as the simulators draw them: geometric from 1 Byte on
+    '''
+    p = -np.expm1(-1./mean_pkt_size)
+    return 1./p, (2. - p)/p**2
+# End of function `get_pkt_size_moments`
+
+def get_mm1_reference(mean_iat, mean_pkt_size, out_rate, q_cap=np.inf, srv_num=1):
+    '''
+    Reference values of the statistics `mm1.MM1_Sim.run` returns, service
+    times taken as exponential with the mean of the whole-Byte packet sizes.
+    `q_cap` packets can wait besides the ones in service, as in the simulator.
+    '''
+    lamb, mean_size = 1./mean_iat, get_pkt_size_moments(mean_pkt_size)[0]
+    state_probs, blocking_prob, mean_wait = solve_mmck(float(lamb), float(out_rate/(8.*mean_size)), int(srv_num),
+                                                        float(q_cap) + srv_num)
+
+    return {'mean wait (ms)': 1000.*mean_wait,
+            'loss rate': blocking_prob,
+            'throughput (bps)': 8.*mean_size*lamb*(1. - blocking_prob),
+            'mean system state': (np.arange(len(state_probs))*state_probs).sum()}
+# End of function `get_mm1_reference`
+
+def get_pq_reference(mean_IATs, mean_pkt_SIZEs, DSCPs, out_rate, q_cap=np.inf):
+    '''
+    Reference mean waits of the statistics `pq.DiffServ_Sim.run` returns,
+    overall and per app, for whole-Byte exponential packet sizes and
+    unlimited queues. Apps of the same PHB share a class, lower PHB values go first.
+    '''
+    if q_cap != np.inf: raise ValueError('The priority reference only holds for unlimited queues.')
+
+    LAMBs = 1./np.asarray(mean_IATs, float)
+    mean_SIZEs, size_2nd_MOMs = get_pkt_size_moments(np.asarray(mean_pkt_SIZEs, float))
+    mean_SRVs, srv_2nd_MOMs = 8.*mean_SIZEs/out_rate, size_2nd_MOMs*(8./out_rate)**2
+
+    # Queue IDs as the simulator numbers them
+    phb_VALs = [get_PHB_from_DSCP(dscp).value for dscp in DSCPs]
+    uniq_phbs, q_ids = np.unique(phb_VALs, return_inverse=True)
+
+    q_lambs = np.bincount(q_ids, LAMBs, len(uniq_phbs))
+    q_mean_srvs = np.bincount(q_ids, LAMBs*mean_SRVs, len(uniq_phbs))/q_lambs
+    # Mixed over the apps of a class
+    q_srv_2nd_moms = np.bincount(q_ids, LAMBs*srv_2nd_MOMs, len(uniq_phbs))/q_lambs
+
+    q_waits = get_priority_waits(tuple(q_lambs), tuple(q_mean_srvs), tuple(q_srv_2nd_moms))
+
+    reference = {'mean wait (ms)': 1000.*(LAMBs*q_waits[q_ids]).sum()/LAMBs.sum(),
+                    'loss rate': 0.,
+                    'throughput (bps)': 8.*(LAMBs*mean_SIZEs).sum()}
+
+    for app_id, q_id in enumerate(q_ids):
+        reference[f'app {app_id} mean wait (ms)'] = 1000.*q_waits[q_id]
+        reference[f'app {app_id} loss rate'] = 0.
+        reference[f'app {app_id} throughput (bps)'] = 8.*LAMBs[app_id]*mean_SIZEs[app_id]
+
+    return reference
+# End of function `get_pq_reference`
+
+def compare_with_reference(summary_df, reference, rtol=.05):
+    '''
+    Simulated statistics (a `replicate.summarise_replications` table) next to
+    their reference values. One agrees if it lies within `rtol` of the
+    reference or within its confidence interval of it; an infinite reference
+    (an unstable class) only agrees with an infinite result.
+    '''
+    names = [name for name in reference if name in summary_df.index]
+    refs = pd.Series(reference)[names]
+    sims, errors = summary_df.loc[names, 'mean'], summary_df.loc[names, 'error'].fillna(0.)
+
+    deviations = sims - refs
+
+    return pd.DataFrame({   'simulated': sims,
+                            'error': errors,
+                            'reference': refs,
+                            'deviation (%)': 100.*deviations/refs.where(refs != 0.),
+                            'ok': (deviations.abs() <= np.maximum(rtol*refs.abs(), errors)) & np.isfinite(refs) | (sims == refs)})
+# End of function `compare_with_reference`
+
+if __name__ == '__main__':
+    main()
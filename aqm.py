@@ -0,0 +1,232 @@
+'''
+File name: aqm.py
+'''
+
+from enum import IntEnum
+from dscp_catalog import *
+import numpy as np
+
+__all__ = ['DropReason', 'DROP_REASON_NAMEs', 'TailDrop', 'RandomEarlyDetection', 'WeightedRED', 'CoDel', 'AQMs']
+
+class DropReason(IntEnum):
+    # Queue full, random early drop, sojourn time too long
+    NONE, TAIL, EARLY, SOJOURN = 0, 1, 2, 3
+
+# Drop reason codes --> names used in the traces ('none', 'tail', ...)
+DROP_REASON_NAMEs = np.array([reason.name.lower() for reason in DropReason])
+
+class TailDrop:
+    '''
+    Admission policy of `diffserv.DiffServ_Sim`, asked by the scheduler
+    whenever a packet finds all servers busy. Plain tail drop: the packet
+    joins its queue unless `q_cap` packets are waiting there. Subclasses
+    extend `check` and keep O(1) state per queue, it runs once per arrival.
+    '''
+
+    def __init__(self, sim):
+        self.sim = sim
+    # End of class constructor
+
+    def check(self, pkt_id, q_id):
+        '''
+        Why the packet has to be dropped, `DropReason.NONE` if it may join its queue
+        '''
+        return DropReason.TAIL if len(self.sim.sched.backlog_PKT_IDs[q_id]) >= self.sim.q_cap else DropReason.NONE
+    # End of method `check`
+
+    def admit(self, pkt_id, q_id):
+        '''
+        Whether the packet may join its queue, the reason is recorded if not
+        '''
+        if not (reason:=self.check(pkt_id, q_id)): return True
+
+        self.sim.ag_drops[pkt_id] = True
+        self.sim.ag_drop_reasons[pkt_id] = reason
+        return False
+    # End of method `admit`
+# End of class `TailDrop`
+
+class RandomEarlyDetection(TailDrop):
+    '''
+    Random early detection (Floyd and Jacobson): the drop probability grows
+    linearly with an EWMA of the queue length, from 0 at `min_th` to `max_p`
+    at `max_th` packets, spread out by the count of packets since the last
+    drop. Every packet is dropped once the average reaches `max_th`. The
+    average is only updated on arrivals that find the servers busy, so one
+    finding its queues empty first decays it by (1 - w_q)**m, m being the
+    number of typical packets that could have been sent since they emptied.
+    '''
+    # EWMA weight of the latest queue length
+    w_q = .002
+    # Packets, packets, probability
+    min_th, max_th, max_p = 5., 15., .1
+
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.init_groups([[q_id] for q_id in range(sim.q_num)])
+    # End of class constructor
+
+    def init_groups(self, grp_Q_IDs):
+        '''
+        Queues whose backlogs add up to one average, one group per queue for plain RED
+        '''
+        self.grp_Q_IDs = grp_Q_IDs
+        self.q_grp_ids = np.empty(self.sim.q_num, np.int0)
+        for grp_id, q_ids in enumerate(grp_Q_IDs): self.q_grp_ids[q_ids] = grp_id
+
+        self.grp_AVGs = [0.]*len(grp_Q_IDs)
+        self.grp_COUNTs = [-1]*len(grp_Q_IDs)
+        self.grp_T_UPDATEs = [0.]*len(grp_Q_IDs)
+
+        # Last packet to join every queue: once it is served, its queue is empty
+        self.q_LAST_PKT_IDs = [-1]*self.sim.q_num
+        # Typical transmission time of the output, all servers together
+        self.typ_srv_dur = self.sim.ag_srv_durs.mean()/self.sim.srv_num if len(self.sim.ag_srv_durs) else 1.
+    # End of method `init_groups`
+
+    def get_profile(self, q_id):
+        '''
+        (min_th, max_th, max_p) of the packets of queue `q_id`
+        '''
+        return self.min_th, self.max_th, self.max_p
+    # End of method `get_profile`
+
+    def check(self, pkt_id, q_id):
+        if (reason:=super().check(pkt_id, q_id)): return reason
+
+        grp_id = self.q_grp_ids[q_id]
+        backlog_len = sum(len(self.sim.sched.backlog_PKT_IDs[i]) for i in self.grp_Q_IDs[grp_id])
+
+        # Average queue length, updated on every arrival that has to queue up
+        if backlog_len: avg = (1. - self.w_q)*self.grp_AVGs[grp_id] + self.w_q*backlog_len
+        else: avg = (1. - self.w_q)**self.get_idle_pkt_num(grp_id)*self.grp_AVGs[grp_id]
+
+        self.grp_AVGs[grp_id] = avg
+        self.grp_T_UPDATEs[grp_id] = self.sim.now
+        min_th, max_th, max_p = self.get_profile(q_id)
+
+        if avg < min_th:
+            self.grp_COUNTs[grp_id] = -1
+            self.q_LAST_PKT_IDs[q_id] = pkt_id
+            return DropReason.NONE
+
+        if avg < max_th:
+            self.grp_COUNTs[grp_id] += 1
+            p_b = max_p*(avg - min_th)/(max_th - min_th)
+
+            # Drop with probability p_b/(1 - count*p_b), certainly once count*p_b reaches 1
+            if (count_p_b:=self.grp_COUNTs[grp_id]*p_b) < 1. and np.random.random()*(1. - count_p_b) >= p_b:
+                self.q_LAST_PKT_IDs[q_id] = pkt_id
+                return DropReason.NONE
+
+        self.grp_COUNTs[grp_id] = 0
+        return DropReason.EARLY
+    # End of method `check`
+
+    def get_idle_pkt_num(self, grp_id):
+        '''
+        Typical packets the servers could have sent since the queues of the
+        group emptied (since the last update, if later): their last packet
+        entered service then
+        '''
+        t_empty = self.grp_T_UPDATEs[grp_id]
+
+        for q_id in self.grp_Q_IDs[grp_id]:
+            if (pkt_id:=self.q_LAST_PKT_IDs[q_id]) >= 0:
+                t_empty = max(t_empty, self.sim.ag_dprt_times[pkt_id] - self.sim.ag_srv_durs[pkt_id])
+
+        return max(0., self.sim.now - t_empty)/self.typ_srv_dur
+    # End of method `get_idle_pkt_num`
+# End of class `RandomEarlyDetection`
+
+class WeightedRED(RandomEarlyDetection):
+    '''
+    RED with a profile per drop precedence: AFx3 packets are dropped before
+    AFx2 ones, and those before AFx1 ones. Every PHB has a queue of its own
+    here, so the AFx1, AFx2 and AFx3 queues of a class share one average, as
+    if they were one queue. EF and BE get the profile of precedence 1.
+    '''
+    # Drop precedence --> (min_th, max_th, max_p)
+    prec_PROFILEs = {   1: (10., 20., .05),
+                        2: (7.5, 20., .1),
+                        3: (5., 20., .2)}
+
+    def __init__(self, sim):
+        TailDrop.__init__(self, sim)
+
+        # 'AF12' --> class 'AF1', precedence 2
+        phb_NAMEs = [PHB(phb).name for phb in sim.uniq_phbs]
+        cls_NAMEs = [name[:3] if name.startswith('AF') else name for name in phb_NAMEs]
+        self.q_PRECs = [int(name[3]) if name.startswith('AF') else 1 for name in phb_NAMEs]
+
+        uniq_clss = list(dict.fromkeys(cls_NAMEs))
+        self.init_groups([[q_id for q_id, cls in enumerate(cls_NAMEs) if cls == uniq_cls] for uniq_cls in uniq_clss])
+    # End of class constructor
+
+    def get_profile(self, q_id):
+        return self.prec_PROFILEs[self.q_PRECs[q_id]]
+    # End of method `get_profile`
+# End of class `WeightedRED`
+
+class CoDel(TailDrop):
+    '''
+    Controlled delay (Nichols and Jacobson), checked on arrival: once the head
+    of a queue has waited longer than `target` for a whole `interval`, the
+    queue drops arriving packets at intervals shrinking with the square root
+    of the drop count, until its head waits less than `target` again.
+    '''
+    # Seconds
+    target, interval = .005, .1
+
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.q_FIRST_ABOVEs = [0.]*sim.q_num
+        self.q_DROPPINGs = [False]*sim.q_num
+        self.q_DROP_NEXTs = [0.]*sim.q_num
+        self.q_COUNTs = [0]*sim.q_num
+    # End of class constructor
+
+    def check(self, pkt_id, q_id):
+        if (reason:=super().check(pkt_id, q_id)): return reason
+
+        now = self.sim.now
+        backlog_pkt_ids = self.sim.sched.backlog_PKT_IDs[q_id]
+
+        # The head's arrival time is its timestamp
+        if not backlog_pkt_ids or now - self.sim.ag_arvl_times[backlog_pkt_ids[0]] < self.target:
+            self.q_FIRST_ABOVEs[q_id] = 0.
+            self.q_DROPPINGs[q_id] = False
+            return DropReason.NONE
+
+        if not self.q_DROPPINGs[q_id]:
+            # Above target for a whole interval before dropping starts
+            if not self.q_FIRST_ABOVEs[q_id]:
+                self.q_FIRST_ABOVEs[q_id] = now + self.interval
+                return DropReason.NONE
+
+            if now < self.q_FIRST_ABOVEs[q_id]: return DropReason.NONE
+
+            # Pick up near the last drop rate if dropping stopped only recently
+            self.q_DROPPINGs[q_id] = True
+            count = self.q_COUNTs[q_id]
+            self.q_COUNTs[q_id] = count - 2 if count > 2 and now - self.q_DROP_NEXTs[q_id] < 16*self.interval else 1
+            self.q_DROP_NEXTs[q_id] = now + self.interval/self.q_COUNTs[q_id]**.5
+            return DropReason.SOJOURN
+
+        if now < self.q_DROP_NEXTs[q_id]: return DropReason.NONE
+
+        # Control law, the next drop comes sooner
+        self.q_COUNTs[q_id] += 1
+        self.q_DROP_NEXTs[q_id] += self.interval/self.q_COUNTs[q_id]**.5
+        return DropReason.SOJOURN
+    # End of method `check`
+# End of class `CoDel`
+
+# 'tail': tail drop at `q_cap`
+# 'red': random early detection
+# 'wred': RED per AF drop precedence
+# 'codel': controlled delay
+AQMs = {'tail': TailDrop,
+        'red': RandomEarlyDetection,
+        'wred': WeightedRED,
+        'codel': CoDel}
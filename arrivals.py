@@ -0,0 +1,108 @@
+'''
+File name: arrivals.py
+'''
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from student.implement import *
+import numpy as np
+
+__all__ = ['generate_arrivals', 'iter_arrival_chunks', 'generate_ag_arrivals', 'generate_ag_pkt_sizes']
+
+# Fewer than 2**15 apps, surely
+APP_ID_DTYPE = np.int16
+
+def estimate_arvl_num(lamb):
+    # Expected number plus 3.29 standard deviations (a heuristic), at least one
+    return max(1, int(np.ceil(lamb + 3.29*lamb**.5)))
+# End of function `estimate_arvl_num`
+
+def generate_arrivals(mean_iat, t_limit):
+    '''
+    Inter-arrival and arrival times of all arrivals up to `t_limit`.
+    The first draw almost always suffices; otherwise only the remaining time
+    is topped up and the arrays are resized once.
+    '''
+    IATs = [generate_rand_iats_in_sec(mean_iat, estimate_arvl_num(t_limit/mean_iat))]
+    arvl_TIMEs = [IATs[0].cumsum()]
+
+    while (t_last:=arvl_TIMEs[-1][-1]) < t_limit:
+        iats = generate_rand_iats_in_sec(mean_iat, estimate_arvl_num((t_limit - t_last)/mean_iat))
+
+        arvl_times = iats.cumsum()
+        arvl_times += t_last
+
+        IATs.append(iats)
+        arvl_TIMEs.append(arvl_times)
+
+    iats, arvl_times = (IATs[0], arvl_TIMEs[0]) if len(IATs) == 1 else (np.concatenate(IATs), np.concatenate(arvl_TIMEs))
+
+    # Views, not masked copies
+    arvl_num = np.searchsorted(arvl_times, t_limit, 'right')
+    return iats[:arvl_num], arvl_times[:arvl_num]
+# End of function `generate_arrivals`
+
+def iter_arrival_chunks(mean_iat, t_limit, chunk_len=1<<16):
+    '''
+    Arrivals up to `t_limit` as (iats, arvl_times) chunks of at most
+    `chunk_len`, memory stays flat however long the horizon
+    '''
+    t_last = 0.
+
+    while True:
+        iats = generate_rand_iats_in_sec(mean_iat, chunk_len)
+
+        arvl_times = iats.cumsum()
+        arvl_times += t_last
+
+        if arvl_times[-1] > t_limit:
+            if arvl_num:=np.searchsorted(arvl_times, t_limit, 'right'):
+                yield iats[:arvl_num], arvl_times[:arvl_num]
+            return
+
+        yield iats, arvl_times
+        t_last = arvl_times[-1]
+# End of function `iter_arrival_chunks`
+
+def generate_ag_arrivals(mean_IATs, t_limit, poisson=True):
+    '''
+    Arrivals of all apps merged in time order: (ag_iats, ag_arvl_times, ag_app_ids).
+    Poisson streams superpose into one Poisson stream of the summed rate, in
+    which each packet comes from app i with probability rate_i/(summed rate),
+    so no sorting is needed. Other streams are drawn per app and merged by one
+    stable sort, which keeps equal times in app order.
+    '''
+    if poisson:
+        rates = 1./np.asarray(mean_IATs, float)
+
+        ag_iats, ag_arvl_times = generate_arrivals(1./rates.sum(), t_limit)
+
+        # Categorical draw of every packet's app
+        cum_probs = np.cumsum(rates/rates.sum())[:-1]
+        ag_app_ids = np.searchsorted(cum_probs, np.random.random(len(ag_arvl_times)), 'right').astype(APP_ID_DTYPE)
+
+        return ag_iats, ag_arvl_times, ag_app_ids
+
+    arvl_TIMEs = [generate_arrivals(mean_iat, t_limit)[1] for mean_iat in mean_IATs]
+
+    ag_arvl_times = np.concatenate(arvl_TIMEs)
+    ag_app_ids = np.repeat(np.arange(len(arvl_TIMEs), dtype=APP_ID_DTYPE), list(map(len, arvl_TIMEs)))
+
+    sort_idc = np.argsort(ag_arvl_times, kind='stable')
+    ag_arvl_times, ag_app_ids = ag_arvl_times[sort_idc], ag_app_ids[sort_idc]
+
+    return np.diff(ag_arvl_times, prepend=0.), ag_arvl_times, ag_app_ids
+# End of function `generate_ag_arrivals`
+
+def generate_ag_pkt_sizes(mean_pkt_SIZEs, ag_app_ids):
+    '''
+    Packet sizes in Bytes, each drawn with the mean of its app
+    '''
+    ag_pkt_sizes = np.empty(len(ag_app_ids))
+
+    for app_id, mean_pkt_size in enumerate(mean_pkt_SIZEs):
+        msk = ag_app_ids == app_id
+        ag_pkt_sizes[msk] = np.ceil(generate_rand_pkt_sizes_in_byte(mean_pkt_size, msk.sum()))
+
+    return ag_pkt_sizes
+# End of function `generate_ag_pkt_sizes`
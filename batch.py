@@ -0,0 +1,132 @@
+'''
+File name: batch.py
+'''
+
+import sys, os, json, ast, argparse, importlib
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+__all__ = []
+
+# Simulator module --> its simulator class
+SIM_CLASSes = { 'mm1': 'MM1_Sim',
+                'mm1_mapp': 'MM1_Sim',
+                'pq': 'DiffServ_Sim',
+                'diffserv': 'DiffServ_Sim',
+                'rr': 'DiffServ_Sim',
+                'wltx': 'WlTx_Sim'}
+
+ANALYSERs = ('an_mm1', 'an_diffserv', 'an_wltx')
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                description='Run a simulator or an analyser unattended, without any prompts.',
+                epilog='examples:\n'
+                        '  python batch.py pq --config pq.json --set t_limit=120 --set q_cap=inf\n'
+                        '  python batch.py an_diffserv --t-res 100 --fig-dir figures',
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('module', choices=[*SIM_CLASSes, *ANALYSERs])
+
+    sim_grp = parser.add_argument_group('simulators')
+    sim_grp.add_argument('--config', help='JSON file of simulator parameters, e.g. {"t_limit": 60, "q_cap": 10}')
+    sim_grp.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                            help='simulator parameter (a Python literal), overrides the config file')
+    sim_grp.add_argument('--trace-chunk-len', type=int, help='write the DiffServ trace in batches of that many rows')
+
+    ana_grp = parser.add_argument_group('analysers')
+    ana_grp.add_argument('--plot', action='append', metavar='NAME',
+                            help='plot method (e.g. sys_state_hist) or menu number, all of them by default')
+    ana_grp.add_argument('--t-res', type=float, default=10., help='time resolution in milliseconds (default: 10)')
+    ana_grp.add_argument('--byt-res', type=float, default=10., help='packet size resolution in Bytes (default: 10)')
+    ana_grp.add_argument('--sampl-size', type=int, default=100, help='sample size of confidence intervals (default: 100)')
+    ana_grp.add_argument('--save-data', action='store_true', help='store plotted time series to results/tmp_result.csv')
+    ana_grp.add_argument('--fig-dir', default=os.path.join(os.path.dirname(__file__), 'figures'))
+    ana_grp.add_argument('--fig-format', default='png')
+
+    args = parser.parse_args(argv)
+
+    if args.module in SIM_CLASSes: run_simulator(args)
+    else: run_analyser(args)
+# End of function `main`
+
+def run_simulator(args):
+    sim_kwargs = {}
+    if args.config:
+        with open(args.config) as file:
+            sim_kwargs.update(json.load(file))
+
+    for item in args.set:
+        name, _, text = item.partition('=')
+        sim_kwargs[name.strip()] = parse_value(text.strip())
+
+    sim_cls = getattr(importlib.import_module(args.module), SIM_CLASSes[args.module])
+    if args.trace_chunk_len: sim_cls.trace_chunk_len = args.trace_chunk_len
+
+    sim_cls(**normalise_sim_kwargs(sim_kwargs)).simulate(interactive=False)
+# End of function `run_simulator`
+
+def run_analyser(args):
+    # Pick the file-only backend before the analyser imports pyplot
+    import matplotlib
+    matplotlib.use('Agg')
+
+    import headless
+    headless.batch = {  't_res': args.t_res,
+                        'byt_res': args.byt_res,
+                        'sampl_sz': args.sampl_size,
+                        'save_data': 'y' if args.save_data else 'n',
+                        'fig_dir': args.fig_dir,
+                        'fig_format': args.fig_format}
+
+    ana = importlib.import_module(args.module).load_analyser()
+
+    for label, plot in select_plots(ana.options, args.plot):
+        print(f'\n{label}:')
+        headless.fig_name = plot.__name__
+        plot()
+# End of function `run_analyser`
+
+def select_plots(options, names):
+    if not names: return options
+
+    plot_from_name = {plot.__name__: (label, plot) for label, plot in options}
+
+    selection = []
+    for name in names:
+        if name.isdigit() and 1 <= int(name) <= len(options):
+            selection.append(options[int(name) - 1])
+        elif name in plot_from_name:
+            selection.append(plot_from_name[name])
+        else:
+            sys.exit(f'Error!!! Unknown plot "{name}", expected one of: {", ".join(plot_from_name)}.')
+
+    return selection
+# End of function `select_plots`
+
+def parse_value(text):
+    '''
+    Python literal ('[1E-3, 2E-3]', '0x2e', ...), else float ('inf'), else text
+    '''
+    try: return ast.literal_eval(text)
+    except (ValueError, SyntaxError): pass
+
+    try: return float(text)
+    except ValueError: return text
+# End of function `parse_value`
+
+def normalise_sim_kwargs(sim_kwargs):
+    '''
+    JSON has no hex numbers nor enums: DSCPs may come as '0x2e', PHB weight keys by name
+    '''
+    if 'DSCPs' in sim_kwargs:
+        sim_kwargs['DSCPs'] = [int(dscp, 0) if isinstance(dscp, str) else dscp for dscp in sim_kwargs['DSCPs']]
+
+    if 'phb_WEIs' in sim_kwargs:
+        from dscp_catalog import PHB
+        sim_kwargs['phb_WEIs'] = {(PHB[phb] if isinstance(phb, str) else phb): weight
+                                        for phb, weight in sim_kwargs['phb_WEIs'].items()}
+
+    return sim_kwargs
+# End of function `normalise_sim_kwargs`
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
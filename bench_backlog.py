@@ -0,0 +1,92 @@
+'''
+File name: bench_backlog.py
+'''
+
+import sys, os, time, timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from collections import deque
+import numpy as np
+
+__all__ = []
+
+def main():
+        # Feel free to modify the parameters below.
+    sim_time_limit            = 600                     # seconds
+    utilisation               = .95
+    mean_inter_arrival_times  = [3E-3, 3E-3, 3E-3]      # seconds
+    mean_pkt_sizes            = [100, 150, 100]         # Bytes
+    dscps                     = [0x2e, 0x0a, 0x00]
+    backlog_LENs              = [20, 100000]            # packets
+    server_number             = 4
+
+    out_rate = 8.*(np.asarray(mean_pkt_sizes)/np.asarray(mean_inter_arrival_times)).sum()/utilisation
+
+    print('One enqueue + dequeue with the given backlog:')
+    for backlog_len, list_dur, deque_dur in bench_backlog_ops(backlog_LENs):
+        print(f'\t{backlog_len:>7} pkts:\tlist.pop(0) {1E9*list_dur:8.0f} ns\tdeque.popleft() {1E9*deque_dur:8.0f} ns')
+
+    print(f'\nPQ on the event calendar at {utilisation:.0%} utilisation, {sim_time_limit} s:')
+    event_num, dur = bench_pq(sim_time_limit, mean_inter_arrival_times, mean_pkt_sizes, dscps, out_rate)
+    print(f'\t{event_num} events in {dur:.2f} s ({event_num/dur:.3g} events/s)')
+
+    print(f'\nM/M/{server_number} FIFO at {utilisation:.0%} utilisation, {sim_time_limit} s:')
+    pkt_num, dur = bench_multi_server(sim_time_limit, mean_inter_arrival_times[0], mean_pkt_sizes[0],
+                                        8.*mean_pkt_sizes[0]/mean_inter_arrival_times[0]/utilisation/server_number, server_number)
+    print(f'\t{pkt_num} packets in {dur:.2f} s ({pkt_num/dur:.3g} packets/s)')
+# End of function `main`
+
+def bench_backlog_ops(backlog_LENs, op_num=100000):
+    '''
+    (backlog_len, list_dur, deque_dur) per backlog length: seconds per pair of
+    append and pop from the head, for the former list of (pkt_id, srv_dur)
+    tuples and for the deque of packet IDs
+    '''
+    results = []
+
+    for backlog_len in backlog_LENs:
+        backlog_list = [(pkt_id, 1E-3) for pkt_id in range(backlog_len)]
+        backlog_deque = deque(range(backlog_len))
+
+        list_dur = timeit.timeit(lambda: (backlog_list.append((0, 1E-3)), backlog_list.pop(0)), number=op_num)/op_num
+        deque_dur = timeit.timeit(lambda: (backlog_deque.append(0), backlog_deque.popleft()), number=op_num)/op_num
+
+        results.append((backlog_len, list_dur, deque_dur))
+
+    return results
+# End of function `bench_backlog_ops`
+
+def bench_pq(t_limit, mean_IATs, mean_pkt_SIZEs, DSCPs, out_rate):
+    '''
+    (event_num, seconds) of one PQ run on the event calendar, no trace
+    '''
+    from pq import DiffServ_Sim
+
+    np.random.seed(0)
+    simulator = DiffServ_Sim(t_limit, np.inf, mean_IATs, mean_pkt_SIZEs, DSCPs, out_rate)
+    simulator.compiled = False
+    simulator.record_trace = False
+
+    simulator.generate_arrival_times()
+    simulator.compute_system_events()
+
+    return simulator.calendar.event_num, simulator.calendar.wall_dur
+# End of function `bench_pq`
+
+def bench_multi_server(t_limit, mean_iat, mean_pkt_size, out_rate, srv_num):
+    '''
+    (pkt_num, seconds) of one multi-server `mm1.MM1_Sim` run, which goes
+    through `fifo_queue.compute_multi_server_waits`
+    '''
+    from mm1 import MM1_Sim
+
+    np.random.seed(0)
+    simulator = MM1_Sim(t_limit, np.inf, mean_iat, mean_pkt_size, out_rate, srv_num)
+
+    t_start = time.perf_counter()
+    simulator.run()
+
+    return simulator.pkt_num, time.perf_counter() - t_start
+# End of function `bench_multi_server`
+
+if __name__ == '__main__':
+    main()
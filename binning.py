@@ -0,0 +1,98 @@
+'''
+File name: binning.py
+'''
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+__all__ = ['TimeBinner']
+
+class TimeBinner:
+    '''
+    Time series of a trace binned by time, per group of rows (e.g. per BEP).
+    The timestamps are sorted once; a series is then a difference of
+    cumulative sums taken at the bin edges, found by `searchsorted`. The
+    cumulative sums only depend on what is summed, not on the resolution,
+    so both they and the binned series are cached: going back to a plot or
+    a resolution seen before costs nothing, a new resolution only the
+    edge lookups.
+    '''
+    # Cumulative sums hold one number per row, far more than a series
+    cum_cache_size, series_cache_size = 4, 64
+
+    def __init__(self, df, time_col, group_col=None, t_ends=None):
+        '''
+        Rows of `df` are binned by `time_col` from 0 up to `t_ends`, one per
+        group (in the order of `grp_VALs`), by default each group's last
+        `time_col` value in trace order
+        '''
+        self.df = df
+        times = df[time_col].to_numpy(float)
+
+        if group_col is None: grp_codes, self.grp_VALs = np.zeros(len(df), np.int0), np.array([None])
+        else: grp_codes, self.grp_VALs = pd.factorize(df[group_col], sort=True)
+
+        if t_ends is None: t_ends = pd.Series(times).groupby(grp_codes).last().to_numpy()
+        self.t_ends = np.asarray(t_ends, float)
+
+        # Traces usually come sorted within contiguous groups already
+        grp_steps = np.diff(grp_codes)
+        if np.all((grp_steps > 0) | (grp_steps == 0) & (times[1:] >= times[:-1])): self.sort_idc = None
+        else: self.sort_idc = np.lexsort((times, grp_codes))
+
+        self.times = times if self.sort_idc is None else times[self.sort_idc]
+        self.grp_bounds = np.searchsorted(grp_codes if self.sort_idc is None else grp_codes[self.sort_idc],
+                                            np.arange(len(self.grp_VALs) + 1))
+
+        self.get_cum_sums = lru_cache(maxsize=self.cum_cache_size)(self.compute_cum_sums)
+        self.get_series = lru_cache(maxsize=self.series_cache_size)(self.compute_series)
+    # End of class constructor
+
+    def compute_cum_sums(self, weight_col=None, where=None):
+        '''
+        Running count (or sum of `weight_col`) of the rows in time order, 0
+        first, over the rows with `where` = (column, value) only if given.
+        Every group restarts from 0 at its first row.
+        '''
+        if weight_col is None: weights = np.ones(len(self.times), np.int64)
+        else: weights = self.sorted_col(weight_col)
+
+        if where is not None:
+            col, val = where
+            weights = np.where(self.sorted_col(col) == val, weights, 0)
+
+        cum_sums = np.hstack((0, weights.cumsum()))
+        cum_sums.setflags(write=False)
+        return cum_sums
+    # End of method `compute_cum_sums`
+
+    def sorted_col(self, col):
+        vals = self.df[col].to_numpy()
+        return vals if self.sort_idc is None else vals[self.sort_idc]
+    # End of method `sorted_col`
+
+    def compute_series(self, t_res, weight_col=None, where=None, t_end=None):
+        '''
+        Per group, (x, sums): bin centres and count (or sum of `weight_col`)
+        per bin of `t_res` seconds, bins as `np.histogram` makes them on
+        `np.arange(0, t_end, t_res)` (the last one closed), `t_end` being the
+        group's by default. Results are cached, hence read-only.
+        '''
+        cum_sums = self.get_cum_sums(weight_col, where)
+        series = []
+
+        for grp_id, (lo, hi) in enumerate(zip(self.grp_bounds[:-1], self.grp_bounds[1:])):
+            edges = np.arange(0, self.t_ends[grp_id] if t_end is None else t_end, t_res)
+
+            edge_idc = lo + np.searchsorted(self.times[lo:hi], edges, 'left')
+            if len(edges): edge_idc[-1] = lo + np.searchsorted(self.times[lo:hi], edges[-1], 'right')
+
+            x, sums = edges[1:] - 0.5*t_res, np.diff(cum_sums[edge_idc])
+            x.setflags(write=False)
+            sums.setflags(write=False)
+            series.append((x, sums))
+
+        return series
+    # End of method `compute_series`
+# End of class `TimeBinner`
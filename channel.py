@@ -0,0 +1,95 @@
+'''
+File name: channel.py
+'''
+
+import numpy as np
+
+__all__ = ['MarkovChannel', 'GilbertElliott']
+
+class MarkovChannel:
+    '''
+    Channel hopping between states of their own bit error probability: it
+    stays in state i for an exponential time of mean `mean_SOJOURNs[i]`
+    seconds, then moves to state j with probability `jump_PROBs[i][j]`.
+    Packets see the state they arrive in.
+    '''
+
+    def __init__(self, BEPs, mean_SOJOURNs, jump_PROBs):
+        self.BEPs = np.asarray(BEPs, float)
+        self.mean_SOJOURNs = np.asarray(mean_SOJOURNs, float)
+        self.jump_PROBs = np.asarray(jump_PROBs, float)
+        self.state_num = len(self.BEPs)
+
+        assert self.state_num==len(self.mean_SOJOURNs)==len(self.jump_PROBs), "Error!!! Numbers of BEPs, sojourns and jump rows don't match."
+        assert np.allclose(self.jump_PROBs.sum(1), 1.), 'Error!!! Every row of jump probabilities must add up to 1.'
+
+        # Share of time in every state: visits of the jump chain weighted by how long they last
+        eqs = np.vstack((self.jump_PROBs.T - np.eye(self.state_num), np.ones(self.state_num)))
+        visit_probs = np.linalg.lstsq(eqs, np.hstack((np.zeros(self.state_num), 1.)), rcond=None)[0]
+
+        self.state_PROBs = visit_probs*self.mean_SOJOURNs/(visit_probs*self.mean_SOJOURNs).sum()
+        self.mean_bep = (self.state_PROBs*self.BEPs).sum()
+    # End of class constructor
+
+    def draw_states(self, first_state, jump_num, rng):
+        '''
+        States of the next `jump_num` sojourns after `first_state`'s,
+        one Python step per jump (jumps are far fewer than packets)
+        '''
+        cum_PROBs = self.jump_PROBs.cumsum(1)
+        states = np.empty(jump_num, np.int0)
+        state = first_state
+
+        for jump_id, u in enumerate(rng.random(jump_num)):
+            states[jump_id] = state = min(np.searchsorted(cum_PROBs[state], u, 'right'), self.state_num - 1)
+
+        return states
+    # End of method `draw_states`
+
+    def draw_sojourns(self, t_limit, rng, sojourns=None, t_from=0.):
+        '''
+        (t_starts, states) of the sojourns covering [0, t_limit], starting in
+        steady state: sojourn k spans [t_starts[k], t_starts[k+1]). Given the
+        `sojourns` drawn up to `t_from`, carries them on to `t_limit` instead,
+        what is left of their last one being exponential again.
+        '''
+        if sojourns is None: t_starts, states = np.zeros(1), np.array([rng.choice(self.state_num, p=self.state_PROBs)])
+        else: t_starts, states = sojourns
+
+        # The last sojourn is drawn again, from `t_from` on
+        new_states = states[-1:]
+        t_ends = t_from + rng.exponential(self.mean_SOJOURNs[new_states])
+
+        # Expected jumps left plus a margin, topped up if short
+        while t_ends[-1] < t_limit:
+            jump_num = int(2*(t_limit - t_ends[-1])/self.mean_SOJOURNs.min()) + 1
+
+            next_states = self.draw_states(new_states[-1], jump_num, rng)
+            next_t_ends = rng.exponential(self.mean_SOJOURNs[next_states]).cumsum()
+            next_t_ends += t_ends[-1]
+
+            new_states, t_ends = np.hstack((new_states, next_states)), np.hstack((t_ends, next_t_ends))
+
+        sojourn_num = np.searchsorted(t_ends, t_limit, 'left') + 1
+        return np.hstack((t_starts, t_ends[:sojourn_num-1])), np.hstack((states[:-1], new_states[:sojourn_num]))
+    # End of method `draw_sojourns`
+
+    def __repr__(self):
+        return f'{type(self).__name__}(mean bep={self.mean_bep:g})'
+    # End of method `__repr__`
+# End of class `MarkovChannel`
+
+class GilbertElliott(MarkovChannel):
+    '''
+    Two-state channel, state 0 good and state 1 bad, alternating
+    '''
+
+    def __init__(self, bep_good, bep_bad, mean_good, mean_bad):
+        super().__init__([bep_good, bep_bad], [mean_good, mean_bad], [[0., 1.], [1., 0.]])
+    # End of class constructor
+
+    def draw_states(self, first_state, jump_num, rng):
+        # Nothing to draw
+        return (first_state + 1 + np.arange(jump_num)) % 2
+    # End of method `draw_states`
+# End of class `GilbertElliott`
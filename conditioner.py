@@ -0,0 +1,216 @@
+'''
+File name: conditioner.py
+'''
+
+from enum import IntEnum
+from dscp_catalog import *
+import numpy as np
+
+__all__ = ['Color', 'COLOR_NAMEs', 'SingleRateTCM', 'TwoRateTCM', 'Shaper', 'condition_packets', 'merge_shaped_packets']
+
+# Without Numba the meters run as plain Python loops, still once per
+# conditioned app before the event loop starts
+try:
+    from numba import njit
+except ImportError:
+    njit = lambda **kwargs: (lambda func: func)
+
+class Color(IntEnum):
+    GREEN, YELLOW, RED = 0, 1, 2
+
+# Color codes --> names used in the traces ('green', ...)
+COLOR_NAMEs = np.array([color.name.lower() for color in Color])
+
+# PHB value, color --> PHB value: AF packets take the drop precedence of
+# their color (AFx1, AFx2, AFx3) unless theirs is higher, others keep their PHB
+REMARK_TABLE = np.array([[PHB[f'{phb.name[:3]}{max(int(phb.name[3]), color + 1)}'].value if phb.name.startswith('AF')
+                            else phb.value for color in Color] for phb in sorted(PHB, key=lambda phb: phb.value)])
+
+class SingleRateTCM:
+    '''
+    Single rate three color marker (RFC 2697), color-blind: committed rate
+    `cir` in bps, committed and excess burst sizes `cbs` and `ebs` in Bytes
+    '''
+    # AF packets are re-marked by color
+    marks = True
+
+    def __init__(self, cir, cbs, ebs):
+        self.cir = cir
+        self.cbs = cbs
+        self.ebs = ebs
+    # End of class constructor
+
+    def condition(self, arvl_times, pkt_sizes):
+        '''
+        (arvl_times, colors) of packets arriving in time order
+        '''
+        return arvl_times, meter_single_rate(arvl_times, pkt_sizes, self.cir/8., self.cbs, self.ebs)
+    # End of method `condition`
+# End of class `SingleRateTCM`
+
+class TwoRateTCM:
+    '''
+    Two rate three color marker (RFC 2698), color-blind: committed and peak
+    rates `cir` and `pir` in bps, burst sizes `cbs` and `pbs` in Bytes
+    '''
+    marks = True
+
+    def __init__(self, cir, cbs, pir, pbs):
+        self.cir = cir
+        self.cbs = cbs
+        self.pir = pir
+        self.pbs = pbs
+    # End of class constructor
+
+    def condition(self, arvl_times, pkt_sizes):
+        return arvl_times, meter_two_rate(arvl_times, pkt_sizes, self.cir/8., self.cbs, self.pir/8., self.pbs)
+    # End of method `condition`
+# End of class `TwoRateTCM`
+
+class Shaper:
+    '''
+    Token bucket shaper with an unlimited buffer: packets leave in order, each
+    once the bucket (`bucket` Bytes, filled at `rate` bps, full at time 0)
+    holds its size. Every packet stays green.
+    '''
+    marks = False
+
+    def __init__(self, rate, bucket):
+        self.rate = rate
+        self.bucket = bucket
+    # End of class constructor
+
+    def condition(self, arvl_times, pkt_sizes):
+        # Packet i leaves at max(a_i, max over j <= i of a_j + (S_i - S_j-1 - bucket)/rate),
+        # S being the cumulative size, so one running maximum does it
+        rate = self.rate/8.
+        cum_sizes = pkt_sizes.cumsum()
+
+        shaped_times = np.maximum.accumulate(arvl_times - (cum_sizes - pkt_sizes)/rate)
+        shaped_times += (cum_sizes - self.bucket)/rate
+
+        return np.maximum(arvl_times, shaped_times), np.full(len(arvl_times), Color.GREEN, np.int8)
+    # End of method `condition`
+# End of class `Shaper`
+
+@njit(cache=True)
+def meter_single_rate(arvl_times, pkt_sizes, cir, cbs, ebs):
+    colors = np.empty(len(arvl_times), np.int8)
+
+    # Both buckets start full, the committed one overflows into the excess one
+    t_c, t_e, t_last = cbs, ebs, 0.
+
+    for pkt_id in range(len(arvl_times)):
+        tokens = cir*(arvl_times[pkt_id] - t_last)
+        t_last = arvl_times[pkt_id]
+
+        t_e = min(ebs, t_e + max(0., tokens - (cbs - t_c)))
+        t_c = min(cbs, t_c + tokens)
+
+        pkt_size = pkt_sizes[pkt_id]
+
+        if pkt_size <= t_c:
+            colors[pkt_id] = 0
+            t_c -= pkt_size
+        elif pkt_size <= t_e:
+            colors[pkt_id] = 1
+            t_e -= pkt_size
+        else:
+            colors[pkt_id] = 2
+
+    return colors
+# End of function `meter_single_rate`
+
+@njit(cache=True)
+def meter_two_rate(arvl_times, pkt_sizes, cir, cbs, pir, pbs):
+    colors = np.empty(len(arvl_times), np.int8)
+    t_c, t_p, t_last = cbs, pbs, 0.
+
+    for pkt_id in range(len(arvl_times)):
+        t_c = min(cbs, t_c + cir*(arvl_times[pkt_id] - t_last))
+        t_p = min(pbs, t_p + pir*(arvl_times[pkt_id] - t_last))
+        t_last = arvl_times[pkt_id]
+
+        # Over the peak rate: red, over the committed rate: yellow
+        pkt_size = pkt_sizes[pkt_id]
+
+        if pkt_size > t_p:
+            colors[pkt_id] = 2
+        elif pkt_size > t_c:
+            colors[pkt_id] = 1
+            t_p -= pkt_size
+        else:
+            colors[pkt_id] = 0
+            t_p -= pkt_size
+            t_c -= pkt_size
+
+    return colors
+# End of function `meter_two_rate`
+
+@njit(cache=True)
+def merge_sorted_runs(times, shaped_msk, shaped_pkt_ids):
+    sort_idc = np.empty(len(times), np.int64)
+    shaped_id, sort_id = 0, 0
+
+    for pkt_id in range(len(times)):
+        if shaped_msk[pkt_id]: continue
+
+        # Delayed packets go first if earlier, or as early and of a lower ID
+        while shaped_id < len(shaped_pkt_ids):
+            shaped_pkt_id = shaped_pkt_ids[shaped_id]
+            if times[shaped_pkt_id] > times[pkt_id] or times[shaped_pkt_id] == times[pkt_id] and shaped_pkt_id > pkt_id: break
+
+            sort_idc[sort_id] = shaped_pkt_id
+            shaped_id, sort_id = shaped_id + 1, sort_id + 1
+
+        sort_idc[sort_id] = pkt_id
+        sort_id += 1
+
+    sort_idc[sort_id:] = shaped_pkt_ids[shaped_id:]
+
+    return sort_idc
+# End of function `merge_sorted_runs`
+
+def condition_packets(conditioners, arvl_times, pkt_sizes, app_ids, app_PHB_VALs):
+    '''
+    Traffic conditioning ahead of the queues. `conditioners` maps an app ID
+    (its packets) or a PHB (the packets of all apps with that PHB, through
+    one bucket) to a conditioner, applied in turn. Returns per packet the
+    time it reaches the queues, its color and its PHB after re-marking,
+    plus every PHB a packet may end up with.
+    '''
+    app_PHB_VALs = np.asarray(app_PHB_VALs)
+    arvl_times = arvl_times.copy()
+    colors = np.zeros(len(arvl_times), np.int8)
+    uniq_phbs = set(app_PHB_VALs.tolist())
+
+    for key, conditioner in conditioners.items():
+        cond_app_ids = np.flatnonzero(app_PHB_VALs == key.value) if isinstance(key, PHB) else np.array([key])
+        pkt_ids = np.flatnonzero(np.isin(app_ids, cond_app_ids))
+
+        # An earlier shaper may have reordered them
+        pkt_ids = pkt_ids[np.argsort(arvl_times[pkt_ids], kind='stable')]
+        arvl_times[pkt_ids], cond_colors = conditioner.condition(arvl_times[pkt_ids], pkt_sizes[pkt_ids])
+
+        # A packet keeps the worst color it got
+        colors[pkt_ids] = np.maximum(colors[pkt_ids], cond_colors)
+        if conditioner.marks: uniq_phbs.update(REMARK_TABLE[app_PHB_VALs[cond_app_ids]].ravel().tolist())
+
+    return arvl_times, colors, REMARK_TABLE[app_PHB_VALs[app_ids], colors], np.array(sorted(uniq_phbs))
+# End of function `condition_packets`
+
+def merge_shaped_packets(arvl_times, shaped_times):
+    '''
+    Order that sorts `shaped_times` (stable, as `np.argsort(kind='stable')`
+    would) given that they are the sorted `arvl_times` with some of them
+    delayed, None if nothing moved. Only the delayed packets are sorted,
+    then merged back among the others, which are still in order.
+    '''
+    shaped_msk = shaped_times != arvl_times
+    if not shaped_msk.any(): return None
+
+    shaped_pkt_ids = np.flatnonzero(shaped_msk)
+    shaped_pkt_ids = shaped_pkt_ids[np.argsort(shaped_times[shaped_pkt_ids], kind='stable')]
+
+    return merge_sorted_runs(shaped_times, shaped_msk, shaped_pkt_ids)
+# End of function `merge_shaped_packets`
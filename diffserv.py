@@ -0,0 +1,385 @@
+'''
+File name: diffserv.py
+'''
+
+import sys, os, heapq
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from trace_io import *
+from dscp_catalog import *
+from event_calendar import *
+from system_events import *
+from replicate import *
+from student.implement import *
+from arrivals import *
+from sched_kernels import *
+from schedulers import *
+from aqm import *
+from conditioner import *
+import numpy as np
+import pandas as pd
+
+__all__ = ['DiffServ_Sim', 'StopSimulation']
+
+class StopSimulation(Exception):
+    '''
+    Raised by an observer to end the simulation at the current event
+    '''
+# End of class `StopSimulation`
+
+class DiffServ_Sim:
+    '''
+    Servers fed by one queue per PHB. What differs between disciplines
+    lives in a `schedulers.Scheduler`, picked by name ('pq', 'wrr', 'drr',
+    'wfq') or given as a subclass. An `observer` with methods
+    `before_event(sim, event)` and `after_event(sim, event)` gets to watch
+    every event; it may raise `StopSimulation`. Packets that find all servers
+    busy are admitted by an `aqm.TailDrop` policy, picked by name ('tail',
+    'red', 'wred', 'codel') or given as a subclass. `conditioners` meter or
+    shape the traffic of an app (keyed by app ID) or of a PHB ahead of the
+    queues, see `conditioner.condition_packets`.
+    `out_rate` is either the rate of each of `srv_num` alike servers or a
+    list of rates, one per server. A packet takes the idle server with the
+    lowest ID, so list the fastest first.
+    '''
+    # Exponential IATs let all apps be drawn as one merged Poisson stream;
+    # set False if `generate_rand_iats_in_sec` draws anything else
+    poisson_arvls = True
+    # Rebuild and write the event trace in windows of that many arrivals (about
+    # twice as many rows), the packets in batches of that many rows; memory
+    # then stays bounded by a window. None: all in one go
+    trace_chunk_len = None
+    # Replications only need the packets, not the event trace
+    record_trace = True
+    # Run the scheduler as a compiled array kernel if it has one, else on the event calendar
+    compiled = HAVE_NUMBA
+
+    def simulate(self, interactive=True):
+        print('Simulation has started.')
+        self.generate_arrival_times()
+        self.compute_system_events()
+        self.save_simulation_results()
+        if interactive: input('\nPress <Enter> to finish.\n')
+    # End of method `simulate`
+
+    def run(self):
+        '''
+        One replication without traces or prompts, returns its summary statistics
+        '''
+        self.record_trace = False
+        self.generate_arrival_times()
+        self.compute_system_events()
+        return self.compute_summary()
+    # End of method `run`
+
+    def __init__(self, t_limit, q_cap, mean_IATs, mean_pkt_SIZEs, DSCPs, out_rate, sched='pq', phb_WEIs=None, observer=None,
+                    srv_num=1, aqm='tail', conditioners=None):
+        self.t_limit = t_limit
+        self.q_cap = q_cap
+        self.mean_IATs = np.asarray(mean_IATs)
+        self.mean_pkt_SIZEs = np.asarray(mean_pkt_SIZEs)
+        self.DSCPs = DSCPs
+        self.out_rate = out_rate
+        self.out_RATEs = np.full(srv_num, out_rate, float) if np.isscalar(out_rate) else np.asarray(out_rate, float)
+        self.srv_num = len(self.out_RATEs)
+        self.sched_cls = SCHEDULERs.get(sched, sched)
+        self.aqm_cls = AQMs.get(aqm, aqm)
+        self.conditioners = conditioners
+        self.phb_WEIs = phb_WEIs
+        self.observer = observer
+        self.app_num = len(mean_IATs)
+
+        assert self.app_num==len(mean_pkt_SIZEs)==len(DSCPs), f"Error!!! Numbers of mean IATs, Pkt Sizes, and DSCPs don't match."
+        assert isinstance(self.sched_cls, type) and issubclass(self.sched_cls, Scheduler), \
+                f"Error!!! Unknown scheduler '{sched}', expected one of {tuple(SCHEDULERs)}."
+        assert isinstance(self.aqm_cls, type) and issubclass(self.aqm_cls, TailDrop), \
+                f"Error!!! Unknown admission policy '{aqm}', expected one of {tuple(AQMs)}."
+    # End of class constructor
+
+    def compute_system_events(self):
+        self.aggregate_and_prepare()
+        self.t_end = self.t_limit
+
+        # Only departures and drops are recorded, both backends give the same ones
+        # (the kernels know tail drop only)
+        if self.compiled and self.sched.kernel is not None and self.observer is None and self.srv_num == 1 \
+            and type(self.aqm) is TailDrop:
+            self.ag_dprt_times, self.ag_drops = run_sched_kernel(self.sched.kernel, self.ag_arvl_times, self.ag_srv_durs,
+                                                    self.ag_q_ids, self.sched.get_kernel_param(), float(self.q_cap), self.t_limit)
+            self.ag_drop_reasons[self.ag_drops] = DropReason.TAIL
+
+        else:
+            # Next-event time advancing
+            try: self.calendar.run(self.t_limit)
+            except StopSimulation: self.t_end = self.now
+
+            print(f'{self.calendar.event_num} events handled ({self.calendar.get_event_rate():.3g} events/s).')
+
+        # The rest of the trace follows from them, window by window when saving if batched
+        if self.record_trace and self.trace_chunk_len is None: self.compute_system_states()
+    # End of method `compute_system_events`
+
+    def compute_system_states(self):
+        event_times, event_types, inc_pkt_ids, sys_states, q_LENs, srv_BUSYs = merge_system_events(
+            self.ag_arvl_times, self.ag_dprt_times, self.ag_drops, self.ag_q_ids, len(self.uniq_phbs), self.t_end,
+            self.ag_srv_ids, self.srv_num)
+
+        self.event_times = event_times
+        self.event_types = event_types
+        self.inc_pkt_ids = inc_pkt_ids.astype(np.int32)
+        self.sys_states = sys_states
+        self.q_LENs = q_LENs.astype(np.int16 if self.q_cap < 2**15 else np.int32)
+        self.srv_BUSYs = srv_BUSYs
+    # End of method `compute_system_states`
+
+    def iter_system_states(self, window_len=None):
+        '''
+        The event trace as (event_lo, events) windows of `window_len` arrivals,
+        see `system_events.iter_system_events`, one window if None
+        '''
+        q_dtype = np.int16 if self.q_cap < 2**15 else np.int32
+
+        for event_lo, (event_times, event_types, inc_pkt_ids, sys_states, q_LENs, srv_BUSYs) in iter_system_events(
+                self.ag_arvl_times, self.ag_dprt_times, self.ag_drops, self.ag_q_ids, len(self.uniq_phbs), self.t_end,
+                self.ag_srv_ids, self.srv_num, window_len):
+            yield event_lo, (event_times, event_types, inc_pkt_ids.astype(np.int32), sys_states, q_LENs.astype(q_dtype), srv_BUSYs)
+    # End of method `iter_system_states`
+
+    def compute_summary(self):
+        '''
+        Summary statistics of all packets, then of every app's packets
+        '''
+        waits = self.ag_dprt_times - self.ag_arvl_times - self.ag_srv_durs
+
+        dropped = self.ag_drops
+
+        summary = summarise_packets(waits, dropped, self.ag_pkt_sizes, self.ag_dprt_times, self.t_limit)
+
+        for app_id in range(self.app_num):
+            msk = self.ag_app_ids == app_id
+            app_summary = summarise_packets(waits[msk], dropped[msk], self.ag_pkt_sizes[msk], self.ag_dprt_times[msk], self.t_limit)
+            summary.update({f'app {app_id} {name}': val for name, val in app_summary.items()})
+
+        return summary
+    # End of method `compute_summary`
+
+    def handle_arrival(self, event):
+        # Advance time
+        self.now, pkt_id = event.time, event.data
+
+        # Which queue does this packet belong to?
+        q_id = self.ag_q_ids[pkt_id]
+
+        # Queue up if all servers are busy, if the scheduler admits it (dropped otherwise)
+        if not self.idle_srv_ids:
+            if self.sched.admit(pkt_id, q_id):
+                self.sched.enqueue(pkt_id, q_id)
+
+        # Get served if a server is free (and the scheduler agrees)
+        elif (srv_pkt_id:=self.sched.serve_idle(pkt_id, q_id)) is not None:
+            # Schedule the next departure
+            self.schedule_departure(srv_pkt_id, heapq.heappop(self.idle_srv_ids))
+
+        # Either way, schedule the next arrival
+        if (pkt_id:=pkt_id + 1) < self.ag_pkt_num:
+            self.calendar.schedule(self.ag_arvl_times[pkt_id], EventType.ARVL, pkt_id)
+    # End of method `handle_arrival`
+
+    def handle_departure(self, event):
+        # Advance time
+        self.now = event.time
+
+        # Which server has just been freed?
+        srv_id = self.ag_srv_ids[event.data]
+
+        # If all queues are empty (or held back), relax the server
+        if (pkt_id:=self.sched.dequeue()) is None:
+            heapq.heappush(self.idle_srv_ids, srv_id)
+
+        # Otherwise schedule the next departure
+        else:
+            self.schedule_departure(pkt_id, srv_id)
+    # End of method `handle_departure`
+
+    def schedule_departure(self, pkt_id, srv_id):
+        # Service durations depend on the server
+        self.ag_srv_ids[pkt_id] = srv_id
+        self.ag_srv_durs[pkt_id] = (srv_dur:=self.srv_DURs[srv_id, pkt_id])
+
+        # Record departure
+        self.ag_dprt_times[pkt_id] = (t_dprt:=self.now + srv_dur)
+
+        # The departing packet comes with the event (for the records only)
+        self.calendar.schedule(t_dprt, EventType.DPRT, pkt_id)
+    # End of method `schedule_departure`
+
+    def observe(self, handler):
+        '''
+        `handler` wrapped in the observer's calls, only used when there is an
+        observer so that the plain loop pays nothing for it
+        '''
+        def handle_observed(event):
+            self.observer.before_event(self, event)
+            handler(event)
+            self.observer.after_event(self, event)
+
+        return handle_observed
+    # End of method `observe`
+
+    def generate_arrival_times(self):
+        self.ag_iats, self.ag_arvl_times, self.ag_app_ids = generate_ag_arrivals(self.mean_IATs, self.t_limit, self.poisson_arvls)
+    # End of method `generate_arrival_times`
+
+    def condition_traffic(self, ag_pkt_sizes, phb_VALs):
+        '''
+        Packets as they reach the queues, conditioned and in time order again:
+        (ag_pkt_sizes, ag_phbs, uniq_phbs), the rest is updated in place
+        '''
+        if not self.conditioners:
+            self.ag_colors = np.zeros(len(self.ag_arvl_times), np.int8)
+            self.ag_shape_delays = np.zeros(len(self.ag_arvl_times))
+            return ag_pkt_sizes, np.asarray(phb_VALs)[self.ag_app_ids], np.unique(phb_VALs)
+
+        ag_arvl_times, ag_colors, ag_phbs, uniq_phbs = condition_packets(self.conditioners, self.ag_arvl_times, ag_pkt_sizes,
+                                                            self.ag_app_ids, phb_VALs)
+
+        # Meters only recolour, shapers delay packets, maybe past the time limit
+        if not any(isinstance(conditioner, Shaper) for conditioner in self.conditioners.values()) \
+            or (sort_idc:=merge_shaped_packets(self.ag_arvl_times, ag_arvl_times)) is None:
+            self.ag_shape_delays = np.zeros(len(ag_arvl_times))
+            self.ag_colors = ag_colors
+            return ag_pkt_sizes, ag_phbs, uniq_phbs
+
+        sort_idc = sort_idc[:np.searchsorted(ag_arvl_times[sort_idc], self.t_limit, 'right')]
+
+        self.ag_shape_delays = (ag_arvl_times - self.ag_arvl_times)[sort_idc]
+        self.ag_arvl_times = ag_arvl_times[sort_idc]
+        self.ag_iats = np.diff(self.ag_arvl_times, prepend=0.)
+        self.ag_app_ids = self.ag_app_ids[sort_idc]
+        self.ag_colors = ag_colors[sort_idc]
+
+        return ag_pkt_sizes[sort_idc], ag_phbs[sort_idc], uniq_phbs
+    # End of method `condition_traffic`
+
+    def aggregate_and_prepare(self):
+        ag_pkt_sizes = generate_ag_pkt_sizes(self.mean_pkt_SIZEs, self.ag_app_ids)
+
+        phb_VALs = [get_PHB_from_DSCP(dscp).value for dscp in self.DSCPs]
+
+        # Meter, mark and shape before the queues
+        ag_pkt_sizes, ag_phbs, uniq_phbs = self.condition_traffic(ag_pkt_sizes, phb_VALs)
+
+        # How many packets are generated in total?
+        ag_pkt_num = len(self.ag_arvl_times)
+
+        # Service durations at every server, packets get those of the server they end up at
+        srv_DURs = np.array([get_srv_durations_in_sec(ag_pkt_sizes, out_rate) for out_rate in self.out_RATEs])
+        ag_srv_durs = srv_DURs[0].copy()
+
+        # Get queue ID base on PHB (PHBs are not necessarily identical to queue IDs)
+        q_id_from_phb = np.empty(max(uniq_phbs) + 1, np.int0)
+        q_id_from_phb[uniq_phbs] = np.arange(q_num:=len(uniq_phbs))
+
+        # Assign aggregate results to class attributes
+        self.ag_srv_durs = ag_srv_durs
+        self.srv_DURs = srv_DURs
+        self.ag_pkt_sizes = ag_pkt_sizes
+        self.ag_pkt_num = ag_pkt_num
+        self.ag_q_ids = q_id_from_phb[ag_phbs]
+        self.uniq_phbs = uniq_phbs
+        self.q_WEIs = [self.phb_WEIs[PHB(phb)] for phb in uniq_phbs] if self.phb_WEIs else [1]*q_num
+        self.q_num = q_num
+
+        # Prepare for events scheduling
+        self.ag_dprt_times = np.full(ag_pkt_num, np.inf)
+        self.ag_drops = np.zeros(ag_pkt_num, bool)
+        self.ag_drop_reasons = np.zeros(ag_pkt_num, np.int8)
+        self.ag_srv_ids = np.zeros(ag_pkt_num, np.int16)
+        self.sched = self.sched_cls(self)
+        self.aqm = self.aqm_cls(self)
+        self.idle_srv_ids = list(range(self.srv_num))
+        self.now = 0.
+
+        # The first arrival kicks everything off
+        self.calendar = EventCalendar()
+
+        for event_type, handler in ((EventType.ARVL, self.handle_arrival), (EventType.DPRT, self.handle_departure)):
+            self.calendar.register(event_type, handler if self.observer is None else self.observe(handler))
+
+        self.calendar.schedule(self.ag_arvl_times[0], EventType.ARVL, 0)
+    # End of `aggregate_and_prepare`
+
+    def get_event_df(self, event_lo, events):
+        event_times, event_types, inc_pkt_ids, sys_states, q_LENs, srv_BUSYs = events
+
+        event_df = pd.DataFrame({   'event id': np.arange(event_lo, event_lo + len(event_times)),
+                                    'timestamp (s)': event_times,
+                                    'type': pd.Categorical.from_codes(event_types, EVENT_NAMEs),
+                                    'incident packet': inc_pkt_ids,
+                                    'system state': sys_states}).set_index('event id')
+
+        for q_id, phb in enumerate(self.uniq_phbs):
+            event_df[f'{PHB(phb).name}-q length'] = q_LENs[:, q_id]
+
+        for srv_id in range(self.srv_num):
+            event_df[f'server {srv_id} busy'] = srv_BUSYs[:, srv_id]
+
+        return event_df
+    # End of method `get_event_df`
+
+    def get_pkt_df(self, lo, hi):
+        hi = min(hi, self.ag_pkt_num)
+
+        waits_millis = (self.ag_dprt_times[lo:hi] - self.ag_arvl_times[lo:hi] - self.ag_srv_durs[lo:hi])*1000.
+        return pd.DataFrame({   'packet id': np.arange(lo, hi),
+                                'app id': self.ag_app_ids[lo:hi],
+                                'size (bytes)': self.ag_pkt_sizes[lo:hi],
+                                'arrive (s)': self.ag_arvl_times[lo:hi],
+                                'depart (s)': self.ag_dprt_times[lo:hi],
+                                'wait (ms)': waits_millis,
+                                'server id': self.ag_srv_ids[lo:hi],
+                                'color': pd.Categorical.from_codes(self.ag_colors[lo:hi], COLOR_NAMEs),
+                                'shaping delay (ms)': self.ag_shape_delays[lo:hi]*1000.,
+                                'drop reason': pd.Categorical.from_codes(self.ag_drop_reasons[lo:hi], DROP_REASON_NAMEs)}).set_index('packet id')
+    # End of method `get_pkt_df`
+
+    def save_simulation_results(self):
+        print('\nSaving simulation trace... ', end='', flush=True)
+        trace_dir = os.path.join(os.path.dirname(__file__), 'simtrace')
+
+        # Without batching, every table is written in one go
+        chunk_len = self.trace_chunk_len or max(self.ag_pkt_num, 1)
+
+        if self.trace_chunk_len is None:
+            event_windows = [(0, (self.event_times, self.event_types, self.inc_pkt_ids, self.sys_states, self.q_LENs,
+                                    self.srv_BUSYs))]
+        else: event_windows = self.iter_system_states(self.trace_chunk_len)
+
+        try:
+            try: os.mkdir(trace_dir)
+            except FileExistsError: pass
+
+            # Store event list
+            event_writer = TraceWriter(os.path.join(trace_dir, 'events'))
+            for event_lo, events in event_windows:
+                event_writer.write(self.get_event_df(event_lo, events))
+            event_writer.close()
+
+            # Store packets
+            pkt_writer = TraceWriter(os.path.join(trace_dir, 'packets'))
+            for lo in range(0, self.ag_pkt_num, chunk_len):
+                pkt_writer.write(self.get_pkt_df(lo, lo + chunk_len))
+            pkt_writer.close()
+
+            # Store apps
+            app_df = pd.DataFrame({ 'app id': np.arange(self.app_num),
+                                    'dscp': np.vectorize(hex)(self.DSCPs)}).set_index('app id')
+
+            write_trace(app_df, os.path.join(trace_dir, 'apps'))
+
+        except PermissionError as err:
+            print(f'\nError!!! Failed to save simulation trace to "{trace_dir}".')
+            print('Make sure its files are not being opened.')
+            return
+
+        print('Done!')
+    # End of method `save_simulation_results`
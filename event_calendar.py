@@ -0,0 +1,74 @@
+'''
+File name: event_calendar.py
+'''
+
+import heapq, time
+from collections import namedtuple
+from enum import IntEnum
+import numpy as np
+
+__all__ = ['EventType', 'EVENT_NAMEs', 'Event', 'EventCalendar']
+
+class EventType(IntEnum):
+    # When events coincide, the lower value is handled first
+    DPRT, ARVL = 0, 1
+
+# Event type codes --> names used in the traces ('dprt', 'arvl', ...)
+EVENT_NAMEs = np.array([event_type.name.lower() for event_type in EventType])
+
+# `seq` keeps coinciding events of the same type in scheduling order,
+# `data` is whatever the handler needs (packet ID, server ID, ...)
+Event = namedtuple('Event', ['time', 'type', 'seq', 'data'])
+
+class EventCalendar:
+    '''
+    Future event list kept as a binary heap, O(log n) per event
+    '''
+
+    def __init__(self):
+        self.heap = []
+        self.seq = 0
+        self.handlers = [None]*len(EventType)
+        self.event_num = 0
+        self.wall_dur = 0.
+    # End of class constructor
+
+    def register(self, event_type, handler):
+        self.handlers[event_type] = handler
+    # End of method `register`
+
+    def schedule(self, t, event_type, data=None):
+        # Skip the keyword-parsing constructor of namedtuple, it's on the hot path
+        heapq.heappush(self.heap, tuple.__new__(Event, (t, event_type, self.seq, data)))
+        self.seq += 1
+    # End of method `schedule`
+
+    def run(self, t_limit, after_event=None):
+        '''
+        Handle events in time order until the next one falls after `t_limit`.
+        `after_event` is called with every handled event, e.g. to record states.
+        '''
+        heap, handlers = self.heap, self.handlers
+        event_num = 0
+        t_start = time.perf_counter()
+
+        # A handler may stop the run by raising, what ran so far still counts
+        try:
+            while heap and heap[0].time <= t_limit:
+                event = heapq.heappop(heap)
+                handlers[event.type](event)
+
+                if after_event is not None: after_event(event)
+                event_num += 1
+
+        finally:
+            self.wall_dur += time.perf_counter() - t_start
+            self.event_num += event_num
+    # End of method `run`
+
+    def get_event_rate(self):
+        '''
+        Handled events per second of wall-clock time
+        '''
+        return self.event_num/self.wall_dur if self.wall_dur > 0 else 0.
+    # End of method `get_event_rate`
\ No newline at end of file
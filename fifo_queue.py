@@ -0,0 +1,127 @@
+'''
+File name: fifo_queue.py
+'''
+
+import heapq
+from collections import deque
+import numpy as np
+
+__all__ = ['compute_fifo_waits', 'compute_multi_server_waits']
+
+def compute_fifo_waits(arvl_times, iats, srv_durs, q_cap=np.inf):
+    '''
+    Waiting times of packets served in FIFO order by a single server.
+    A packet blocked by a full queue gets a waiting time of `np.inf`.
+    '''
+    if q_cap == np.inf:
+        return compute_waits_unlimited(iats, srv_durs)
+
+    return compute_waits_limited(arvl_times, iats, srv_durs, q_cap)
+# End of function `compute_fifo_waits`
+
+def compute_waits_unlimited(iats, srv_durs, chunk_len=1<<16):
+    '''
+    Lindley's recursion, there is no queue to overflow.
+    Unrolled, W_n = C_n - min(0, C_0, ..., C_n) where C is the cumulative sum of
+    S_{n-1} - A_n, so every chunk costs a cumsum and a running minimum.
+    '''
+    pkt_num = len(iats)
+    waits = np.empty(pkt_num)
+    t_sojrn = 0.
+
+    # Restarting the sums every chunk keeps their rounding error small
+    for lo in range(0, pkt_num, chunk_len):
+        hi = min(lo + chunk_len, pkt_num)
+
+        incs = -iats[lo:hi]
+        incs[0] += t_sojrn
+        incs[1:] += srv_durs[lo:hi-1]
+
+        cum_incs = incs.cumsum()
+        waits[lo:hi] = cum_incs - np.minimum(np.minimum.accumulate(cum_incs), 0.)
+
+        # Sojourn time of the last packet carries over to the next chunk
+        t_sojrn = waits[hi-1] + srv_durs[hi-1]
+
+    return waits
+# End of function `compute_waits_unlimited`
+
+def compute_waits_limited(arvl_times, iats, srv_durs, q_cap):
+    '''
+    Lindley's recursion with blocking, the queue holds at most `q_cap` packets
+    '''
+    t_wait, t_sojrn = 0., 0.
+    waits = []
+
+    # Departure times of the packets still in the system, oldest first.
+    # FIFO packets leave in arrival order, so only the head ever expires.
+    in_sys_dprts = deque()
+
+    for pkt_id in range(len(arvl_times)):
+        t_wait = max(0., t_sojrn - iats[pkt_id])
+        t_arvl = arvl_times[pkt_id]
+
+        # Forget packets that have left before this arrival
+        while in_sys_dprts and in_sys_dprts[0] <= t_arvl:
+            in_sys_dprts.popleft()
+
+        # The packet in service (if any) is not queueing
+        q_len = max(0, len(in_sys_dprts) - 1)
+
+        if q_len < q_cap:
+            srv_dur = srv_durs[pkt_id]
+            t_sojrn = t_wait + srv_dur
+            in_sys_dprts.append(t_arvl + t_sojrn)
+            waits.append(t_wait)
+
+        else:
+            t_sojrn = t_wait
+            waits.append(np.inf)
+
+    return np.asarray(waits)
+# End of function `compute_waits_limited`
+
+def compute_multi_server_waits(arvl_times, srv_DURs, q_cap=np.inf):
+    '''
+    Waiting times and server IDs of packets served in FIFO order by several
+    servers, `srv_DURs[s]` being the service durations at server s.
+    A packet takes the idle server with the lowest ID, else waits for the
+    first one to free up, O(log c) per packet with c servers.
+    A packet blocked by a full queue gets a waiting time of `np.inf`.
+    '''
+    srv_num, pkt_num = srv_DURs.shape
+    waits = np.empty(pkt_num)
+    srv_ids = np.zeros(pkt_num, np.int16)
+
+    # Idle servers by ID, busy servers by the time they free up
+    idle_srv_ids = list(range(srv_num))
+    busy_SRVs = []
+
+    # Service start times of the queueing packets, FIFO so non-decreasing
+    q_starts = deque()
+
+    for pkt_id, t_arvl in enumerate(arvl_times.tolist()):
+        while busy_SRVs and busy_SRVs[0][0] <= t_arvl:
+            heapq.heappush(idle_srv_ids, heapq.heappop(busy_SRVs)[1])
+
+        # Forget packets that have entered service before this arrival
+        while q_starts and q_starts[0] <= t_arvl:
+            q_starts.popleft()
+
+        if idle_srv_ids:
+            t_start, srv_id = t_arvl, heapq.heappop(idle_srv_ids)
+
+        elif len(q_starts) < q_cap:
+            t_start, srv_id = heapq.heappop(busy_SRVs)
+            q_starts.append(t_start)
+
+        else:
+            waits[pkt_id] = np.inf
+            continue
+
+        waits[pkt_id] = t_start - t_arvl
+        srv_ids[pkt_id] = srv_id
+        heapq.heappush(busy_SRVs, (t_start + srv_DURs[srv_id, pkt_id], srv_id))
+
+    return waits, srv_ids
+# End of function `compute_multi_server_waits`
\ No newline at end of file
@@ -0,0 +1,48 @@
+'''
+File name: headless.py
+'''
+
+import os
+
+__all__ = ['is_interactive', 'get_batch_answer', 'show_figures']
+
+# Answers to the analysers' prompts and where their figures go, set by
+# batch.py; None means somebody is sitting at the terminal
+batch = None
+
+# Base name of the figure files of the plot being drawn
+fig_name = 'figure'
+
+def is_interactive():
+    return batch is None
+# End of function `is_interactive`
+
+def get_batch_answer(key):
+    '''
+    The batch answer to a prompt, None in an interactive session
+    '''
+    return None if batch is None else batch.get(key)
+# End of function `get_batch_answer`
+
+def show_figures():
+    '''
+    Show the open figures, or in a batch run, save them to files and close them
+    '''
+    import matplotlib.pyplot as plt
+
+    if batch is None:
+        plt.show()
+        return
+
+    os.makedirs(batch['fig_dir'], exist_ok=True)
+
+    fig_nums = plt.get_fignums()
+    for i, fig_num in enumerate(fig_nums):
+        suffix = f'-{i + 1}' if len(fig_nums) > 1 else ''
+        file_path = os.path.join(batch['fig_dir'], f'{fig_name}{suffix}.{batch["fig_format"]}')
+
+        plt.figure(fig_num).savefig(file_path)
+        print(f'Figure saved to "{file_path}".')
+
+    plt.close('all')
+# End of function `show_figures`
@@ -7,7 +7,13 @@ Date created: 14/04/2020
 import sys, os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from aux_.pyaux import *
+from trace_io import *
 from student.implement import *
+from arrivals import *
+from fifo_queue import *
+from event_calendar import *
+from system_events import *
+from replicate import *
 import numpy as np
 import pandas as pd
 
@@ -17,84 +23,71 @@ def main():
     queue_capacity           = np.inf    # packets
     mean_inter_arrival_time  =     # seconds
     mean_pkt_size            =     # Bytes
-    out_rate                 =     # bps
+    out_rate                 =     # bps, or a list of rates, one per server
+    server_number            = 1         # servers of rate `out_rate` (M/M/c)
 
     simulator = MM1_Sim(t_limit=sim_time_limit,
                         q_cap=queue_capacity,
                         mean_iat=mean_inter_arrival_time,
                         mean_pkt_size=mean_pkt_size,
-                        out_rate=out_rate)
+                        out_rate=out_rate,
+                        srv_num=server_number)
 
     simulator.simulate()
 # End of function `main`
 
 class MM1_Sim:
 
-    def simulate(self):
+    def simulate(self, interactive=True):
         print('Simulation has started.')
         self.generate_arrival_times()
         self.compute_system_events()
         self.save_simulation_results()
-        input('\nPress <Enter> to finish.\n')
+        if interactive: input('\nPress <Enter> to finish.\n')
     # End of method `simulate`
 
-    def __init__(self, t_limit, q_cap, mean_iat, mean_pkt_size, out_rate):
+    def run(self):
+        '''
+        One replication without traces or prompts, returns its summary statistics
+        '''
+        self.generate_arrival_times()
+        self.compute_departure_times()
+        return self.compute_summary()
+    # End of method `run`
+
+    def __init__(self, t_limit, q_cap, mean_iat, mean_pkt_size, out_rate, srv_num=1):
         self.t_limit = t_limit
         self.q_cap = q_cap
         self.mean_iat = mean_iat
         self.mean_pkt_size = mean_pkt_size
         self.out_rate = out_rate
+
+        # One rate per server: `srv_num` alike servers (M/M/c) or heterogeneous ones
+        self.out_RATEs = np.full(srv_num, out_rate, float) if np.isscalar(out_rate) else np.asarray(out_rate, float)
+        self.srv_num = len(self.out_RATEs)
     # End of class constructor
 
     def generate_arrival_times(self):
-        # Pre-estimate number of arrivals
-        lamb = self.t_limit/self.mean_iat
-            # 3.29 below is just a heuristic number
-        arvl_num = np.ceil(lamb + 3.29*lamb**.5).astype(np.int0)
-
-        iats = generate_rand_iats_in_sec(self.mean_iat, arvl_num)
-        while iats.sum() < self.t_limit:
-            iats = np.concatenate((iats, generate_rand_iats_in_sec(self.mean_iat, arvl_num)))
-
-        arvl_times = iats.cumsum()
-
-        self.iats = iats[(msk:= arvl_times<=self.t_limit)]
-        self.arvl_times = arvl_times[msk]
+        self.iats, self.arvl_times = generate_arrivals(self.mean_iat, self.t_limit)
     # End of method `generate_arrival_times`
 
     def compute_departure_times(self):
         pkt_num = len(self.arvl_times)
 
         pkt_sizes = np.ceil(generate_rand_pkt_sizes_in_byte(self.mean_pkt_size, pkt_num))
-        srv_durs = get_srv_durations_in_sec(pkt_sizes, self.out_rate)
-        
-        t_wait, t_sojrn = 0., 0.
-        waits = []
-
-        if self.q_cap == np.inf:
-            # It's easier if the queue is unlimited
-            for pkt_id in range(pkt_num):
-                t_wait = max(0., t_sojrn - self.iats[pkt_id])
-                t_sojrn = t_wait + srv_durs[pkt_id]
-                waits.append(t_wait)
+
+        if self.srv_num == 1:
+            srv_durs = get_srv_durations_in_sec(pkt_sizes, self.out_RATEs[0])
+            waits = compute_fifo_waits(self.arvl_times, self.iats, srv_durs, self.q_cap)
+            srv_ids = np.zeros(pkt_num, np.int16)
 
         else:
-            cum_backlog_srv_durs = np.array([0.])
-            for pkt_id in range(pkt_num):
-                t_wait = max(0., t_sojrn - self.iats[pkt_id])
-                q_len = np.argmax(t_wait <= cum_backlog_srv_durs)
-
-                if q_len < self.q_cap:
-                    srv_dur = srv_durs[pkt_id]
-                    t_sojrn = t_wait + srv_dur
-                    cum_backlog_srv_durs = np.insert(cum_backlog_srv_durs[:q_len+1] + srv_dur, 0, srv_dur)
-                    waits.append(t_wait)
-
-                else:
-                    t_sojrn = t_wait
-                    waits.append(np.inf)
-
-        self.waits = np.asarray(waits)
+            srv_DURs = np.array([get_srv_durations_in_sec(pkt_sizes, out_rate) for out_rate in self.out_RATEs])
+            waits, srv_ids = compute_multi_server_waits(self.arvl_times, srv_DURs, self.q_cap)
+            srv_durs = srv_DURs[srv_ids, np.arange(pkt_num)]
+
+        self.waits = waits
+        self.srv_ids = srv_ids
         self.srv_durs = srv_durs
         self.dprt_times = self.arvl_times + self.waits + srv_durs
         self.pkt_sizes = pkt_sizes
@@ -103,26 +96,24 @@ class MM1_Sim:
 
     def compute_system_events(self):
         self.compute_departure_times()
-        
-        event_times = np.hstack((self.arvl_times, self.dprt_times))
-
-        sys_changes = np.hstack((np.ones(self.pkt_num), -np.ones(self.pkt_num)))
-        sys_changes[:self.pkt_num][np.isinf(self.dprt_times)] = 0.
-
-        event_types = np.asarray(['arvl']*self.pkt_num + ['dprt']*self.pkt_num)
 
-        sort_idc = np.argsort(event_times)
-        event_times = event_times[sort_idc]
+        # Blocked packets are the only ones never served
+        event_times, event_types, inc_pkt_ids, sys_states, _, srv_BUSYs = merge_system_events(
+            self.arvl_times, self.dprt_times, np.isinf(self.waits), np.zeros(self.pkt_num, np.int0), 1, self.t_limit,
+            self.srv_ids, self.srv_num)
 
-        event_num = (event_times <= self.t_limit).sum()
-
-        self.event_times = event_times[:event_num]
-        self.sys_changes = sys_changes[sort_idc][:event_num]
-        self.sys_states = self.sys_changes.cumsum()
-        self.event_types = event_types[sort_idc][:event_num]
-        self.inc_pkt_ids = sort_idc[:event_num] % self.pkt_num
+        self.event_times = event_times
+        self.sys_states = sys_states
+        self.event_types = EVENT_NAMEs[event_types]
+        self.inc_pkt_ids = inc_pkt_ids
+        self.srv_BUSYs = srv_BUSYs
     # End of method `compute_system_events`
 
+    def compute_summary(self):
+        # Blocked packets are the only ones never served
+        return summarise_packets(self.waits, np.isinf(self.waits), self.pkt_sizes, self.dprt_times, self.t_limit)
+    # End of method `compute_summary`
+
     def save_simulation_results(self):
         print('\nSaving simulation trace... ', end='', flush=True)
         # Store event list
@@ -132,13 +123,16 @@ class MM1_Sim:
                                     'incident packet': self.inc_pkt_ids,
                                     'system state': self.sys_states}).set_index('event id')
 
+        for srv_id in range(self.srv_num):
+            event_df[f'server {srv_id} busy'] = self.srv_BUSYs[:, srv_id]
+
         trace_dir = os.path.join(os.path.dirname(__file__), 'simtrace')
 
         try: os.mkdir(trace_dir)
         except FileExistsError: pass
 
-        file_path = os.path.join(trace_dir, 'events.csv')
-        try: event_df.to_csv(file_path)
+        file_path = os.path.join(trace_dir, 'events')
+        try: write_trace(event_df, file_path)
         except PermissionError as err:
             print(f'\nError!!! Failed to save simulation trace to "{file_path}".')
             print('Make sure this file is not being opened.')
@@ -149,11 +143,12 @@ class MM1_Sim:
                                 'size (bytes)': self.pkt_sizes,
                                 'arrive (s)': self.arvl_times,
                                 'depart (s)': self.dprt_times,
-                                'wait (ms)': 1000.*self.waits}).set_index('packet id')
+                                'wait (ms)': 1000.*self.waits,
+                                'server id': self.srv_ids}).set_index('packet id')
 
-        file_path = os.path.join(trace_dir, 'packets.csv')
+        file_path = os.path.join(trace_dir, 'packets')
 
-        try: pkt_df.to_csv(file_path)
+        try: write_trace(pkt_df, file_path)
         except PermissionError as err:
             print(f'\nError!!! Failed to store simulation trace to "{file_path}".')
             print('Make sure this file is not being opened.')
@@ -7,7 +7,10 @@ Date created: 14/04/2020
 import sys, os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from aux_.pyaux import *
+from trace_io import *
 from student.implement import *
+from arrivals import *
+from fifo_queue import *
 import numpy as np
 import pandas as pd
 
@@ -29,13 +32,16 @@ def main():
 # End of function `main`
 
 class MM1_Sim:
+    # Exponential IATs let all apps be drawn as one merged Poisson stream;
+    # set False if `generate_rand_iats_in_sec` draws anything else
+    poisson_arvls = True
 
-    def simulate(self):
+    def simulate(self, interactive=True):
         print('Simulation has started.')
         self.generate_arrival_times()
         self.compute_system_events()
         self.save_simulation_results()
-        input('\nPress <Enter> to finish.\n')
+        if interactive: input('\nPress <Enter> to finish.\n')
     # End of method `simulate`
 
     def __init__(self, t_limit, q_cap, mean_IATs, mean_pkt_SIZEs, out_rate):
@@ -51,77 +57,22 @@ class MM1_Sim:
     # End of class constructor
 
     def generate_arrival_times(self):
-        # Pre-estimate number of arrivals
-        LAMBs = self.t_limit/self.mean_IATs
-            # 3.29 below is just a heuristic number
-        arvl_NUMs = np.ceil(LAMBs + 3.29*LAMBs**.5).astype(np.int0)
-
-        self.IATs, self.arvl_TIMEs = [], []
-
-        for mean_iat, arvl_num in zip(self.mean_IATs, arvl_NUMs):
-            iats = generate_rand_iats_in_sec(mean_iat, arvl_num)
-            while iats.sum() < self.t_limit:
-                iats = np.concatenate((iats, generate_rand_iats_in_sec(mean_iat, arvl_num)))
-
-            arvl_times = iats.cumsum()
-            self.IATs.append(iats[(msk:= arvl_times<=self.t_limit)])
-            self.arvl_TIMEs.append(arvl_times[msk])
+        self.ag_iats, self.ag_arvl_times, self.ag_app_ids = generate_ag_arrivals(self.mean_IATs, self.t_limit, self.poisson_arvls)
     # End of method `generate_arrival_times`
 
     def compute_departure_times(self):
-        pkt_NUMs = list(map(len, self.arvl_TIMEs))
-
-        pkt_SIZEs = list(map(lambda arg: np.ceil(generate_rand_pkt_sizes_in_byte(*arg)), zip(self.mean_pkt_SIZEs, pkt_NUMs)))
-        srv_DURs = [get_srv_durations_in_sec(pkt_sizes, self.out_rate) for pkt_sizes in pkt_SIZEs]
-
-        # Aggregate arrival times
-        ag_arvl_times = np.hstack(self.arvl_TIMEs)
-        ag_arvl_times = ag_arvl_times[(sort_idc:=np.argsort(ag_arvl_times))]
+        # How many packets are generated in total?
+        ag_pkt_num = len(self.ag_arvl_times)
 
-        # Aggregate iats
-        ag_iats = np.diff(ag_arvl_times, prepend=0.)
+        ag_pkt_sizes = generate_ag_pkt_sizes(self.mean_pkt_SIZEs, self.ag_app_ids)
+        ag_srv_durs = get_srv_durations_in_sec(ag_pkt_sizes, self.out_rate)
 
-        # Aggregate sds, pkt sizes, app ids
-        ag_srv_durs, ag_pkt_sizes, ag_app_ids = \
-                np.vstack(( np.hstack(srv_DURs)[sort_idc],
-                            np.hstack(pkt_SIZEs)[sort_idc],
-                            np.repeat(np.arange(self.app_num), pkt_NUMs) ))[:, sort_idc]
+        ag_waits = compute_fifo_waits(self.ag_arvl_times, self.ag_iats, ag_srv_durs, self.q_cap)
 
-        # How many packets are generated in total?
-        ag_pkt_num = sum(pkt_NUMs)
-        
-        t_wait, t_sojrn = 0., 0.
-        ag_waits = []
-
-        if self.q_cap == np.inf:
-            # It's easier if the queue is unlimited
-            for pkt_id in range(ag_pkt_num):
-                t_wait = max(0., t_sojrn - ag_iats[pkt_id])
-                t_sojrn = t_wait + ag_srv_durs[pkt_id]
-                ag_waits.append(t_wait)
-
-        else:
-            cum_backlog_srv_durs = np.array([0.])
-            for pkt_id in range(ag_pkt_num):
-                t_wait = max(0., t_sojrn - ag_iats[pkt_id])
-                q_len = np.argmax(t_wait <= cum_backlog_srv_durs)
-
-                if q_len < self.q_cap:
-                    srv_dur = ag_srv_durs[pkt_id]
-                    t_sojrn = t_wait + srv_dur
-                    cum_backlog_srv_durs = np.insert(cum_backlog_srv_durs[:q_len+1] + srv_dur, 0, srv_dur)
-                    ag_waits.append(t_wait)
-
-                else:
-                    t_sojrn = t_wait
-                    ag_waits.append(np.inf)
-
-        self.ag_waits = np.asarray(ag_waits)
+        self.ag_waits = ag_waits
         self.ag_srv_durs = ag_srv_durs
-        self.ag_arvl_times = ag_arvl_times
-        self.ag_dprt_times = ag_arvl_times + self.ag_waits + ag_srv_durs
+        self.ag_dprt_times = self.ag_arvl_times + ag_waits + ag_srv_durs
         self.ag_pkt_sizes = ag_pkt_sizes
-        self.ag_app_ids = ag_app_ids
         self.ag_pkt_num = ag_pkt_num
     # End of `compute_departure_times`
 
@@ -161,8 +112,8 @@ class MM1_Sim:
         try: os.mkdir(trace_dir)
         except FileExistsError: pass
 
-        file_path = os.path.join(trace_dir, 'events.csv')
-        try: event_df.to_csv(file_path)
+        file_path = os.path.join(trace_dir, 'events')
+        try: write_trace(event_df, file_path)
         except PermissionError as err:
             print(f'\nError!!! Failed to save simulation trace to "{file_path}".')
             print('Make sure this file is not being opened.')
@@ -176,9 +127,9 @@ class MM1_Sim:
                                 'depart (s)': self.ag_dprt_times,
                                 'wait (ms)': 1000.*self.ag_waits}).set_index('packet id')
 
-        file_path = os.path.join(trace_dir, 'packets.csv')
+        file_path = os.path.join(trace_dir, 'packets')
 
-        try: pkt_df.to_csv(file_path)
+        try: write_trace(pkt_df, file_path)
         except PermissionError as err:
             print(f'\nError!!! Failed to store simulation trace to "{file_path}".')
             print('Make sure this file is not being opened.')
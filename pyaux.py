@@ -6,9 +6,9 @@ Date created: 14/04/2020
 
 import subprocess as sp, os
 from os import name
-from matplotlib.widgets import AxesWidget, RadioButtons
 
-__all__ = ['ESC_OPTS', 'clscr', 'makePath', 'MyRadioButtons']
+# `MyRadioButtons` is left out, a star import would pull in matplotlib
+__all__ = ['ESC_OPTS', 'clscr', 'makePath']
 
 ESC_OPTS = {'0', 'e', 'E', 'q', 'Q'}
 
@@ -40,66 +40,82 @@ def makePath(curDir, isfile=False):
         os.mkdir(curDir)
 # End of function `makePath`
 
-
-
-class MyRadioButtons(RadioButtons):
-
-    def __init__(self, ax, labels, active=0, activecolor='blue', size=49,
-                 orientation="vertical", **kwargs):
-        """
-        Add radio buttons to an `~.axes.Axes`.
-        Parameters
-        ----------
-        ax : `~matplotlib.axes.Axes`
-            The axes to add the buttons to.
-        labels : list of str
-            The button labels.
-        active : int
-            The index of the initially selected button.
-        activecolor : color
-            The color of the selected button.
-        size : float
-            Size of the radio buttons
-        orientation : str
-            The orientation of the buttons: 'vertical' (default), or 'horizontal'.
-        Further parameters are passed on to `Legend`.
-        """
-        AxesWidget.__init__(self, ax)
-        self.activecolor = activecolor
-        axcolor = ax.get_facecolor()
-        self.value_selected = None
-
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.set_navigate(False)
-
-        circles = []
-        for i, label in enumerate(labels):
-            if i == active:
-                self.value_selected = label
-                facecolor = activecolor
-            else:
-                facecolor = axcolor
-            p = ax.scatter([],[], s=size, marker="o", edgecolor='black',
-                           facecolor=facecolor)
-            circles.append(p)
-        if orientation == "horizontal":
-            kwargs.update(ncol=len(labels), mode="expand")
-        kwargs.setdefault("frameon", False)    
-        self.box = ax.legend(circles, labels, loc="center", **kwargs)
-        self.labels = self.box.texts
-        self.circles = self.box.legendHandles
-        for c in self.circles:
-            c.set_picker(5)
-        self.cnt = 0
-        self.observers = {}
-
-        self.connect_event('pick_event', self._clicked)
-
-
-    def _clicked(self, event):
-        if (self.ignore(event) or event.mouseevent.button != 1 or
-            event.mouseevent.inaxes != self.ax):
-            return
-        if event.artist in self.circles:
-            self.set_active(self.circles.index(event.artist))
\ No newline at end of file
+def __getattr__(attr):
+    '''
+    `MyRadioButtons` is only built on first use, so that modules which never
+    plot (e.g. the simulators) start without importing matplotlib
+    '''
+    if attr == 'MyRadioButtons':
+        globals()[attr] = make_radio_buttons_class()
+        return globals()[attr]
+
+    raise AttributeError(f"module '{__name__}' has no attribute '{attr}'")
+# End of function `__getattr__`
+
+def make_radio_buttons_class():
+    from matplotlib.widgets import AxesWidget, RadioButtons
+
+    class MyRadioButtons(RadioButtons):
+
+        def __init__(self, ax, labels, active=0, activecolor='blue', size=49,
+                     orientation="vertical", **kwargs):
+            """
+            Add radio buttons to an `~.axes.Axes`.
+            Parameters
+            ----------
+            ax : `~matplotlib.axes.Axes`
+                The axes to add the buttons to.
+            labels : list of str
+                The button labels.
+            active : int
+                The index of the initially selected button.
+            activecolor : color
+                The color of the selected button.
+            size : float
+                Size of the radio buttons
+            orientation : str
+                The orientation of the buttons: 'vertical' (default), or 'horizontal'.
+            Further parameters are passed on to `Legend`.
+            """
+            AxesWidget.__init__(self, ax)
+            self.activecolor = activecolor
+            axcolor = ax.get_facecolor()
+            self.value_selected = None
+
+            ax.set_xticks([])
+            ax.set_yticks([])
+            ax.set_navigate(False)
+
+            circles = []
+            for i, label in enumerate(labels):
+                if i == active:
+                    self.value_selected = label
+                    facecolor = activecolor
+                else:
+                    facecolor = axcolor
+                p = ax.scatter([],[], s=size, marker="o", edgecolor='black',
+                               facecolor=facecolor)
+                circles.append(p)
+            if orientation == "horizontal":
+                kwargs.update(ncol=len(labels), mode="expand")
+            kwargs.setdefault("frameon", False)    
+            self.box = ax.legend(circles, labels, loc="center", **kwargs)
+            self.labels = self.box.texts
+            self.circles = self.box.legendHandles
+            for c in self.circles:
+                c.set_picker(5)
+            self.cnt = 0
+            self.observers = {}
+
+            self.connect_event('pick_event', self._clicked)
+
+
+        def _clicked(self, event):
+            if (self.ignore(event) or event.mouseevent.button != 1 or
+                event.mouseevent.inaxes != self.ax):
+                return
+            if event.artist in self.circles:
+                self.set_active(self.circles.index(event.artist))
+
+    return MyRadioButtons
+# End of function `make_radio_buttons_class`
\ No newline at end of file
@@ -0,0 +1,102 @@
+'''
+File name: replicate.py
+'''
+
+import sys, os, contextlib
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from student.implement import *
+import numpy as np
+import pandas as pd
+
+__all__ = ['run_replications', 'run_replication', 'summarise_replications', 'summarise_packets']
+
+def main():
+    from mm1 import MM1_Sim
+
+        # Feel free to modify the parameters below.
+    replication_num          = 32
+    confidence_level         = .95
+    seed                     = None      # None: fresh entropy every time
+
+    sim_kwargs = dict(  t_limit=60,
+                        q_cap=np.inf,
+                        mean_iat=1E-3,
+                        mean_pkt_size=100,
+                        out_rate=1E6)
+
+    print(f'Running {replication_num} replications of MM1_Sim... ', end='', flush=True)
+    summary_df = run_replications(MM1_Sim, sim_kwargs, replication_num, conf=confidence_level, seed=seed)
+    print('Done!\n')
+
+    print(summary_df.to_string())
+# End of function `main`
+
+def run_replications(sim_cls, sim_kwargs, rep_num, conf=.95, seed=None, max_workers=None):
+    '''
+    Run `rep_num` independent replications of `sim_cls(**sim_kwargs)`, spread
+    over all CPU cores, and return the mean, standard deviation and confidence
+    interval half-width of every summary statistic across replications
+    '''
+    # Statistically independent random streams, one per replication
+    seed_seqs = np.random.SeedSequence(seed).spawn(rep_num)
+
+    max_workers = min(max_workers or os.cpu_count() or 1, rep_num)
+    with ProcessPoolExecutor(max_workers) as executor:
+        summaries = list(executor.map(run_replication, repeat(sim_cls), repeat(sim_kwargs), seed_seqs,
+                                        chunksize=max(1, rep_num//(4*max_workers))))
+
+    return summarise_replications(summaries, conf)
+# End of function `run_replications`
+
+def summarise_replications(summaries, conf=.95):
+    '''
+    Mean, standard deviation and confidence interval half-width of every
+    statistic in `summaries`, a list of per-replication summary dicts
+    '''
+    rep_df = pd.DataFrame(summaries)
+
+    counts = rep_df.count()
+    means = rep_df.mean()
+    stdevs = rep_df.std()
+
+    summary_df = pd.DataFrame({ 'mean': means,
+                                'stdev': stdevs,
+                                'replications': counts,
+                                'error': get_errors(conf, counts, stdevs)})
+    summary_df.index.name = 'statistic'
+
+    return summary_df
+# End of function `summarise_replications`
+
+def run_replication(sim_cls, sim_kwargs, seed_seq):
+    # The student functions draw from NumPy's global generator,
+    # some simulator modules from their own `rng`; seed both
+    global_seq, module_seq = seed_seq.spawn(2)
+    np.random.seed(global_seq.generate_state(8))
+
+    module = sys.modules[sim_cls.__module__]
+    if hasattr(module, 'rng'): module.rng = np.random.default_rng(module_seq)
+
+    # Nobody is watching the worker's progress messages
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return sim_cls(**sim_kwargs).run()
+# End of function `run_replication`
+
+def summarise_packets(waits, dropped, pkt_sizes, dprt_times, t_limit):
+    '''
+    Mean wait of the packets that got served, share of packets dropped, and
+    throughput of the packets delivered by `t_limit`
+    '''
+    served = np.isfinite(waits)
+    delivered = dprt_times <= t_limit
+
+    return {'packets': len(waits),
+            'mean wait (ms)': 1000.*waits[served].mean() if served.any() else np.nan,
+            'loss rate': dropped.mean() if len(waits) else np.nan,
+            'throughput (bps)': 8.*pkt_sizes[delivered].sum()/t_limit}
+# End of function `summarise_packets`
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+'''
+File name: sched_kernels.py
+'''
+
+import time
+import numpy as np
+
+__all__ = ['HAVE_NUMBA', 'run_sched_kernel', 'schedule_priority', 'schedule_round_robin']
+
+# The kernels are plain Python without Numba, correct but no faster
+# than the event calendar, so the simulators only use them with it
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    njit = lambda **kwargs: (lambda func: func)
+    HAVE_NUMBA = False
+
+def run_sched_kernel(kernel, *args):
+    '''
+    Call a scheduling kernel, print its event rate like `EventCalendar`
+    and return (dprt_times, drops)
+    '''
+    t_start = time.perf_counter()
+    dprt_times, drops, event_num = kernel(*args)
+    wall_dur = time.perf_counter() - t_start
+
+    print(f'{event_num} events handled ({event_num/wall_dur if wall_dur > 0 else 0.:.3g} events/s, compiled).')
+
+    return dprt_times, drops
+# End of function `run_sched_kernel`
+
+@njit(cache=True)
+def init_queues(q_ids, q_num):
+    '''
+    One buffer for all queues: every queue gets a slice large enough for all
+    its packets, (buf, heads, tails) with heads == tails when empty
+    '''
+    q_sizes = np.bincount(q_ids, minlength=q_num)
+
+    heads = np.zeros(q_num, np.int64)
+    heads[1:] = np.cumsum(q_sizes)[:-1]
+
+    return np.empty(len(q_ids), np.int64), heads, heads.copy()
+# End of function `init_queues`
+
+@njit(cache=True)
+def schedule_priority(arvl_times, srv_durs, q_ids, q_num, q_cap, t_limit):
+    '''
+    Strict priority with a single server, queue 0 first: the same events in
+    the same order as `pq.DiffServ_Sim` on the event calendar
+    '''
+    pkt_num = len(arvl_times)
+    dprt_times = np.full(pkt_num, np.inf)
+    drops = np.zeros(pkt_num, np.bool_)
+    buf, heads, tails = init_queues(q_ids, q_num)
+
+    pkt_id, event_num = 0, 0
+    t_dprt = np.inf
+
+    while True:
+        t_arvl = arvl_times[pkt_id] if pkt_id < pkt_num else np.inf
+
+        # Departures go first when events coincide
+        if t_dprt <= t_arvl:
+            if t_dprt > t_limit: break
+            now, t_dprt = t_dprt, np.inf
+
+            # Serve the head of the highest priority backlog, if any
+            for q_id in range(q_num):
+                if heads[q_id] == tails[q_id]: continue
+
+                nxt_pkt_id = buf[heads[q_id]]
+                heads[q_id] += 1
+
+                dprt_times[nxt_pkt_id] = t_dprt = now + srv_durs[nxt_pkt_id]
+                break
+
+        else:
+            if t_arvl > t_limit: break
+
+            # Queue up if the server is busy, unless the queue is full
+            if t_dprt < np.inf:
+                q_id = q_ids[pkt_id]
+
+                if tails[q_id] - heads[q_id] < q_cap:
+                    buf[tails[q_id]] = pkt_id
+                    tails[q_id] += 1
+                else:
+                    drops[pkt_id] = True
+
+            # Get served if the server is free
+            else:
+                dprt_times[pkt_id] = t_dprt = t_arvl + srv_durs[pkt_id]
+
+            pkt_id += 1
+
+        event_num += 1
+
+    return dprt_times, drops, event_num
+# End of function `schedule_priority`
+
+@njit(cache=True)
+def schedule_round_robin(arvl_times, srv_durs, q_ids, q_weis, q_cap, t_limit):
+    '''
+    Weighted round robin with a single server, every queue sends up to its
+    weight in packets per round: the same events in the same order as
+    `rr.DiffServ_Sim` on the event calendar
+    '''
+    pkt_num, q_num = len(arvl_times), len(q_weis)
+    dprt_times = np.full(pkt_num, np.inf)
+    drops = np.zeros(pkt_num, np.bool_)
+    buf, heads, tails = init_queues(q_ids, q_num)
+
+    q_quotas = q_weis.copy()
+    cur_q_id = 0
+
+    pkt_id, event_num = 0, 0
+    t_dprt = np.inf
+
+    while True:
+        t_arvl = arvl_times[pkt_id] if pkt_id < pkt_num else np.inf
+
+        # Departures go first when events coincide
+        if t_dprt <= t_arvl:
+            if t_dprt > t_limit: break
+            now, t_dprt = t_dprt, np.inf
+
+            # Check the queue where we left last time first
+            for i in range(q_num):
+                q_id = (cur_q_id + i) % q_num
+
+                if heads[q_id] == tails[q_id] or q_quotas[q_id] <= 0: continue
+
+                q_quotas[q_id] -= 1
+
+                # Stay with the queue until it runs out of quota, then refill it
+                if q_quotas[q_id] > 0: cur_q_id = q_id
+                else:
+                    cur_q_id = (q_id + 1) % q_num
+                    q_quotas[q_id] = q_weis[q_id]
+
+                nxt_pkt_id = buf[heads[q_id]]
+                heads[q_id] += 1
+
+                dprt_times[nxt_pkt_id] = t_dprt = now + srv_durs[nxt_pkt_id]
+                break
+
+        else:
+            if t_arvl > t_limit: break
+            q_id = q_ids[pkt_id]
+
+            # Queue up if the server is busy or if the queue runs out of quota
+            if t_dprt < np.inf or q_quotas[q_id] <= 0:
+                if tails[q_id] - heads[q_id] < q_cap:
+                    buf[tails[q_id]] = pkt_id
+                    tails[q_id] += 1
+                else:
+                    drops[pkt_id] = True
+
+            # Get served if the server is free
+            else:
+                dprt_times[pkt_id] = t_dprt = t_arvl + srv_durs[pkt_id]
+
+            pkt_id += 1
+
+        event_num += 1
+
+    return dprt_times, drops, event_num
+# End of function `schedule_round_robin`
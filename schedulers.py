@@ -0,0 +1,249 @@
+'''
+File name: schedulers.py
+'''
+
+import heapq
+from collections import deque
+import numpy as np
+from sched_kernels import *
+
+__all__ = ['Scheduler', 'PriorityScheduler', 'RoundRobinScheduler', 'DeficitRoundRobinScheduler',
+            'FairQueueingScheduler', 'SCHEDULERs']
+
+class Scheduler:
+    '''
+    Scheduling discipline plugged into `diffserv.DiffServ_Sim`: it keeps one
+    backlog (a deque of packet IDs) per queue, admits arriving packets (as
+    the simulator's admission policy says) and picks the next packet to
+    serve. Subclasses implement `dequeue`, and may override `enqueue` and
+    `serve_idle`.
+    '''
+    # Compiled equivalent in `sched_kernels` (None: event calendar only)
+    kernel = None
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.q_num = len(sim.uniq_phbs)
+        self.backlog_PKT_IDs = [deque() for _ in range(self.q_num)]
+    # End of class constructor
+
+    def admit(self, pkt_id, q_id):
+        '''
+        Whether a packet arriving at busy servers may join its queue, a
+        dropped one gets its reason recorded
+        '''
+        return self.sim.aqm.admit(pkt_id, q_id)
+    # End of method `admit`
+
+    def enqueue(self, pkt_id, q_id):
+        self.backlog_PKT_IDs[q_id].append(pkt_id)
+    # End of method `enqueue`
+
+    def dequeue(self):
+        '''
+        Packet to serve next, None if there is none
+        '''
+        raise NotImplementedError
+    # End of method `dequeue`
+
+    def serve_idle(self, pkt_id, q_id):
+        '''
+        Packet to serve when `pkt_id` arrives at the idle server (all queues
+        are empty then), None to leave the server idle
+        '''
+        return pkt_id
+    # End of method `serve_idle`
+
+    def get_kernel_param(self):
+        '''
+        Scheduler-specific argument of `kernel`
+        '''
+        return self.q_num
+    # End of method `get_kernel_param`
+# End of class `Scheduler`
+
+class PriorityScheduler(Scheduler):
+    '''
+    Strict priority, queue 0 (the highest PHB priority) first
+    '''
+    kernel = staticmethod(schedule_priority)
+
+    def dequeue(self):
+        # Check from high priority to low priority
+        for backlog_pkt_ids in self.backlog_PKT_IDs:
+            if backlog_pkt_ids: return backlog_pkt_ids.popleft()
+
+        return None
+    # End of method `dequeue`
+# End of class `PriorityScheduler`
+
+class RoundRobinScheduler(Scheduler):
+    '''
+    Weighted round robin, a queue sends up to its weight in packets per round
+    '''
+    kernel = staticmethod(schedule_round_robin)
+
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.q_QUOTAS = list(sim.q_WEIs)
+        self.q_id = 0
+    # End of class constructor
+
+    def dequeue(self):
+        # Check the queue where we left last time first
+        for i in range(self.q_num):
+            # Which queue to check now?
+            q_id = (self.q_id + i) % self.q_num
+
+            # If the queue is empty or runs out of quota, move on to the next queue
+            if len(backlog_pkt_ids:=self.backlog_PKT_IDs[q_id]) == 0 \
+                or self.q_QUOTAS[q_id] <= 0: continue
+
+            # Decrement the queue's quota
+            self.q_QUOTAS[q_id] -= 1
+
+            # Remember the incumbent queue...
+            if self.q_QUOTAS[q_id] > 0: self.q_id = q_id
+
+            # ...or the next queue if it runs out of quota
+            else:
+                self.q_id = (q_id + 1) % self.q_num
+
+                # Refill quota
+                self.q_QUOTAS[q_id] = self.sim.q_WEIs[q_id]
+
+            return backlog_pkt_ids.popleft()
+
+        # All queues are empty or out of quota
+        return None
+    # End of method `dequeue`
+
+    def serve_idle(self, pkt_id, q_id):
+        # Queue up if the queue runs out of quota
+        if self.q_QUOTAS[q_id] > 0: return pkt_id
+
+        if self.admit(pkt_id, q_id): self.enqueue(pkt_id, q_id)
+
+        return None
+    # End of method `serve_idle`
+
+    def get_kernel_param(self):
+        return np.asarray(self.sim.q_WEIs, np.int64)
+    # End of method `get_kernel_param`
+# End of class `RoundRobinScheduler`
+
+class DeficitRoundRobinScheduler(Scheduler):
+    '''
+    Deficit round robin, a queue sends up to its weight in quanta of Bytes per
+    round. A quantum is the largest packet of the run, so every turn sends
+    at least one packet.
+    '''
+
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.q_QUANTA = np.multiply(sim.q_WEIs, sim.ag_pkt_sizes.max())
+        self.q_DEFICITs = [0.]*self.q_num
+        self.active_q_ids = deque()
+        self.q_turn_started = False
+    # End of class constructor
+
+    def enqueue(self, pkt_id, q_id):
+        # Only non-empty queues take part in the rounds
+        if not (backlog_pkt_ids:=self.backlog_PKT_IDs[q_id]): self.active_q_ids.append(q_id)
+        backlog_pkt_ids.append(pkt_id)
+    # End of method `enqueue`
+
+    def dequeue(self):
+        '''
+        Head of the first active queue whose deficit covers its size, O(1) amortised
+        '''
+        while self.active_q_ids:
+            q_id = self.active_q_ids[0]
+            backlog_pkt_ids = self.backlog_PKT_IDs[q_id]
+
+            # A queue earns its quantum once per round, when its turn comes
+            if not self.q_turn_started:
+                self.q_DEFICITs[q_id] += self.q_QUANTA[q_id]
+                self.q_turn_started = True
+
+            if (pkt_size:=self.sim.ag_pkt_sizes[backlog_pkt_ids[0]]) <= self.q_DEFICITs[q_id]:
+                self.q_DEFICITs[q_id] -= pkt_size
+                pkt_id = backlog_pkt_ids.popleft()
+
+                # An emptied queue leaves the round and keeps no credit
+                if not backlog_pkt_ids:
+                    self.q_DEFICITs[q_id] = 0.
+                    self.active_q_ids.popleft()
+                    self.q_turn_started = False
+
+                return pkt_id
+
+            # Not enough credit left, the next queue's turn
+            self.active_q_ids.rotate(-1)
+            self.q_turn_started = False
+
+        return None
+    # End of method `dequeue`
+
+    def serve_idle(self, pkt_id, q_id):
+        # Served through the round, so its size is charged
+        self.enqueue(pkt_id, q_id)
+        return self.dequeue()
+    # End of method `serve_idle`
+# End of class `DeficitRoundRobinScheduler`
+
+class FairQueueingScheduler(Scheduler):
+    '''
+    Self-clocked fair queueing, packets go in order of their virtual finish
+    times. Only queue heads compete, so the heap holds at most one packet per
+    queue and a dequeue costs O(log Q).
+    '''
+
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.q_FINISHs = [0.]*self.q_num
+        self.ag_finishes = np.empty(len(sim.ag_arvl_times))
+        self.head_heap = []
+        self.v_time = 0.
+    # End of class constructor
+
+    def enqueue(self, pkt_id, q_id):
+        # Virtual finish time, Bytes of service per unit weight
+        self.q_FINISHs[q_id] = max(self.v_time, self.q_FINISHs[q_id]) + self.sim.ag_pkt_sizes[pkt_id]/self.sim.q_WEIs[q_id]
+        self.ag_finishes[pkt_id] = self.q_FINISHs[q_id]
+
+        if not (backlog_pkt_ids:=self.backlog_PKT_IDs[q_id]):
+            heapq.heappush(self.head_heap, (self.q_FINISHs[q_id], pkt_id, q_id))
+        backlog_pkt_ids.append(pkt_id)
+    # End of method `enqueue`
+
+    def dequeue(self):
+        if not self.head_heap: return None
+
+        # Virtual time is the finish time of the packet in service (self-clocking)
+        self.v_time, pkt_id, q_id = heapq.heappop(self.head_heap)
+
+        backlog_pkt_ids = self.backlog_PKT_IDs[q_id]
+        backlog_pkt_ids.popleft()
+
+        if backlog_pkt_ids:
+            heapq.heappush(self.head_heap, (self.ag_finishes[nxt_pkt_id:=backlog_pkt_ids[0]], nxt_pkt_id, q_id))
+
+        return pkt_id
+    # End of method `dequeue`
+
+    def serve_idle(self, pkt_id, q_id):
+        # Stamped like any other packet, so virtual time moves on
+        self.enqueue(pkt_id, q_id)
+        return self.dequeue()
+    # End of method `serve_idle`
+# End of class `FairQueueingScheduler`
+
+# 'pq': strict priority
+# 'wrr': weighted round robin, packets per round
+# 'drr': deficit round robin, Bytes per round
+# 'wfq': self-clocked fair queueing
+SCHEDULERs = {  'pq': PriorityScheduler,
+                'wrr': RoundRobinScheduler,
+                'drr': DeficitRoundRobinScheduler,
+                'wfq': FairQueueingScheduler}
@@ -0,0 +1,132 @@
+'''
+File name: sweep.py
+'''
+
+import sys, os, json, hashlib
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from itertools import product
+from replicate import *
+import numpy as np
+import pandas as pd
+
+__all__ = ['run_sweep', 'expand_grid']
+
+SWEEP_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'results', 'sweep_cache')
+
+def main():
+    from mm1 import MM1_Sim
+
+        # Feel free to modify the parameters below.
+    replication_num          = 8
+    seed                     = 0
+    base_kwargs = dict( t_limit=60,
+                        mean_pkt_size=100,      # Bytes
+                        out_rate=1E6)           # bps
+        # Every combination of the values below is a sweep point
+    grid = {'mean_iat': 0.8E-3/np.array([.1, .3, .5, .7, .9]),     # seconds
+            'q_cap': [10, np.inf]}                                  # packets
+
+    result_df = run_sweep(MM1_Sim, base_kwargs, grid, rep_num=replication_num, seed=seed)
+
+    print(result_df[result_df['statistic']=='mean wait (ms)'].to_string(index=False))
+
+    results_dir = os.path.join(os.path.dirname(__file__), 'results')
+    result_df.to_csv(file_path:=os.path.join(results_dir, 'sweep.csv'), index=False)
+    print(f'\nSweep results stored to "{file_path}".')
+# End of function `main`
+
+def run_sweep(sim_cls, base_kwargs, points, rep_num=8, conf=.95, seed=0, cache_dir=SWEEP_CACHE_DIR, max_workers=None):
+    '''
+    Run `rep_num` replications of `sim_cls` at every sweep point, in parallel.
+    `points` is either a list of dicts or a grid {parameter: values}; each
+    point overrides `base_kwargs`. Finished points are cached on disk by a
+    hash of their configuration and seed, so an extended sweep only runs
+    the new ones (clear `cache_dir` after changing the simulator itself).
+    All points share the same random streams, which keeps their
+    differences free of sampling noise.
+    Returns a tidy table, one row per point and statistic.
+    '''
+    if isinstance(points, dict): points = expand_grid(points)
+
+    configs = [{**base_kwargs, **point} for point in points]
+    cache_paths = [os.path.join(cache_dir, get_cache_key(sim_cls, config, seed, rep_num) + '.json')
+                        for config in configs]
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Only points missing from the cache are run
+    if todo_ids:=[i for i, path in enumerate(cache_paths) if not os.path.exists(path)]:
+        seed_seqs = np.random.SeedSequence(seed).spawn(rep_num)
+
+        max_workers = min(max_workers or os.cpu_count() or 1, len(todo_ids)*rep_num)
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = [[executor.submit(run_replication, sim_cls, configs[i], seed_seq) for seed_seq in seed_seqs]
+                            for i in todo_ids]
+
+            # Cache every point as soon as it is done, a broken-off sweep keeps them
+            for i, point_futures in zip(todo_ids, futures):
+                with open(cache_paths[i], 'w') as file:
+                    json.dump({ 'config': to_jsonable(configs[i]),
+                                'seed': seed,
+                                'summaries': [future.result() for future in point_futures]}, file)
+
+    point_DFs = []
+    for point, path in zip(points, cache_paths):
+        with open(path) as file:
+            summaries = json.load(file)['summaries']
+
+        point_df = summarise_replications(summaries, conf).reset_index()
+        for col_id, (name, val) in enumerate(point.items()):
+            point_df.insert(col_id, name, [get_label(val)]*len(point_df))
+
+        point_DFs.append(point_df)
+
+    return pd.concat(point_DFs, ignore_index=True)
+# End of function `run_sweep`
+
+def expand_grid(grid):
+    '''
+    {parameter: values} --> list of points, one per combination of values
+    '''
+    return [dict(zip(grid, vals)) for vals in product(*grid.values())]
+# End of function `expand_grid`
+
+def get_cache_key(sim_cls, config, seed, rep_num):
+    text = json.dumps({ 'sim': f'{sim_cls.__module__}.{sim_cls.__qualname__}',
+                        'config': to_jsonable(config),
+                        'seed': seed,
+                        'replications': rep_num}, sort_keys=True)
+
+    return hashlib.sha1(text.encode()).hexdigest()
+# End of function `get_cache_key`
+
+def to_jsonable(val):
+    '''
+    Plain JSON types, enums (e.g. PHB keys of the weights) by name
+    '''
+    if isinstance(val, Enum): return val.name
+
+    if isinstance(val, dict):
+        return {(key.name if isinstance(key, Enum) else str(key)): to_jsonable(v) for key, v in val.items()}
+
+    if isinstance(val, (list, tuple, np.ndarray)): return [to_jsonable(v) for v in val]
+
+    if isinstance(val, np.generic): return val.item()
+
+    return val
+# End of function `to_jsonable`
+
+def get_label(val):
+    # Table cells must be hashable
+    val = to_jsonable(val)
+
+    if isinstance(val, list): return tuple(val)
+    if isinstance(val, dict): return json.dumps(val, sort_keys=True)
+
+    return val
+# End of function `get_label`
+
+if __name__ == '__main__':
+    main()
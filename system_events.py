@@ -0,0 +1,125 @@
+'''
+File name: system_events.py
+'''
+
+import numpy as np
+from event_calendar import *
+
+__all__ = ['merge_system_events', 'iter_system_events']
+
+def merge_system_events(arvl_times, dprt_times, drops, q_ids, q_num, t_limit, srv_ids=None, srv_num=1):
+    '''
+    Event list of `srv_num` servers fed by `q_num` queues, rebuilt from the
+    sorted arrival times and the departure times (and the server of every
+    packet) alone: (event_times, event_types, inc_pkt_ids, sys_states, q_LENs,
+    srv_BUSYs), one row per event up to `t_limit`, the same rows the event
+    calendar would have handled (departures first at equal times)
+    '''
+    for _, events in iter_system_events(arvl_times, dprt_times, drops, q_ids, q_num, t_limit, srv_ids, srv_num):
+        return events
+
+    # Not a single event
+    return (np.empty(0), np.empty(0, np.int8), np.empty(0, np.int64), np.empty(0, np.int32),
+            np.empty((0, q_num), np.int64), np.empty((0, srv_num), np.int8))
+# End of function `merge_system_events`
+
+def iter_system_events(arvl_times, dprt_times, drops, q_ids, q_num, t_limit, srv_ids=None, srv_num=1, window_len=None):
+    '''
+    The rows of `merge_system_events` as (event_lo, events) windows, event_lo
+    being the ID of the window's first event. A window holds the arrivals of
+    `window_len` packets (all of them if None) and the departures up to the
+    next window's first arrival, those before the frontier. States carry
+    over from window to window, so besides the per-packet arrays only one
+    window of rows is ever in memory.
+    '''
+    pkt_num = len(arvl_times)
+    if srv_ids is None: srv_ids = np.zeros(pkt_num, np.int16)
+
+    # Every server serves in departure order: a packet starts when the previous
+    # packet of its server departs, unless that server was idle when it arrived
+    srv_pkt_ids = np.flatnonzero(np.isfinite(dprt_times))
+    srv_pkt_ids = srv_pkt_ids[np.lexsort((dprt_times[srv_pkt_ids], srv_ids[srv_pkt_ids]))]
+
+    prev_pkt_ids = np.hstack((-1, srv_pkt_ids))[:len(srv_pkt_ids)]
+    prev_pkt_ids[np.diff(srv_ids[srv_pkt_ids], prepend=-1) != 0] = -1
+
+    waited = (prev_pkt_ids >= 0) & (dprt_times[prev_pkt_ids] > arvl_times[srv_pkt_ids])
+
+    # Dropped packets leave the system as they were, never served ones stay in it
+    arvl_sys_changes = (~drops).astype(np.int32)
+
+    # Packets join a queue on arrival if they waited or are still waiting...
+    joins = ~drops & np.isinf(dprt_times)
+    joins[srv_pkt_ids[waited]] = True
+
+    # ...and leave it at the departure that frees their server (-1: none leaves)
+    dprt_leave_q_ids = np.full(pkt_num, -1, np.int64)
+    dprt_leave_q_ids[prev_pkt_ids[waited]] = q_ids[srv_pkt_ids[waited]]
+
+    # Servers turn busy at the arrivals that find them idle, and idle at the
+    # departures no waiting packet follows
+    busy_arvls = np.zeros(pkt_num, bool)
+    busy_arvls[srv_pkt_ids[~waited]] = True
+
+    idle_dprts = np.zeros(pkt_num, bool)
+    idle_dprts[srv_pkt_ids[np.hstack((~waited[1:], True))[:len(srv_pkt_ids)]]] = True
+
+    # Only the per-event flags above are needed from here on
+    del srv_pkt_ids, prev_pkt_ids, waited
+
+    # Departures in time order, packet IDs breaking ties as arrivals do
+    dprt_order = np.argsort(dprt_times, kind='stable')
+    sorted_dprt_times = dprt_times[dprt_order]
+
+    arvl_num = np.searchsorted(arvl_times, t_limit, 'right')
+    dprt_num = np.searchsorted(sorted_dprt_times, t_limit, 'right')
+    if window_len is None: window_len = max(arvl_num, 1)
+
+    # States at the end of the last window
+    sys_state, q_lens, srv_busys = 0, np.zeros(q_num, np.int64), np.zeros(srv_num, np.int64)
+    arvl_lo, dprt_lo, event_lo = 0, 0, 0
+
+    while arvl_lo < arvl_num or dprt_lo < dprt_num:
+        arvl_hi = min(arvl_lo + window_len, arvl_num)
+
+        # Departures at the frontier come before the arrival there
+        dprt_hi = dprt_num if arvl_hi == arvl_num else np.searchsorted(sorted_dprt_times, arvl_times[arvl_hi], 'right')
+
+        arvl_pkt_ids, dprt_pkt_ids = np.arange(arvl_lo, arvl_hi), dprt_order[dprt_lo:dprt_hi]
+        arvl_msk = np.hstack((np.ones(len(arvl_pkt_ids), bool), np.zeros(len(dprt_pkt_ids), bool)))
+
+        event_times = np.hstack((arvl_times[arvl_lo:arvl_hi], sorted_dprt_times[dprt_lo:dprt_hi]))
+        event_types = np.where(arvl_msk, EventType.ARVL, EventType.DPRT).astype(np.int8)
+
+        sort_idc = np.lexsort((event_types, event_times))
+        event_times, event_types, arvl_msk = event_times[sort_idc], event_types[sort_idc], arvl_msk[sort_idc]
+        inc_pkt_ids = np.hstack((arvl_pkt_ids, dprt_pkt_ids))[sort_idc]
+        event_num = len(event_times)
+
+        sys_states = np.where(arvl_msk, arvl_sys_changes[inc_pkt_ids], -1).cumsum(dtype=np.int32)
+        sys_states += sys_state
+
+        # Queue and server changes by (event, queue or server), one bincount each
+        arvl_ids, dprt_ids = np.flatnonzero(arvl_msk), np.flatnonzero(~arvl_msk)
+
+        join_ids = arvl_ids[joins[inc_pkt_ids[arvl_ids]]]
+        leave_ids = dprt_ids[dprt_leave_q_ids[inc_pkt_ids[dprt_ids]] >= 0]
+
+        q_changes = np.bincount(join_ids*q_num + q_ids[inc_pkt_ids[join_ids]], minlength=event_num*q_num)
+        q_changes -= np.bincount(leave_ids*q_num + dprt_leave_q_ids[inc_pkt_ids[leave_ids]], minlength=event_num*q_num)
+        q_LENs = q_changes.reshape(event_num, q_num).cumsum(axis=0)
+        q_LENs += q_lens
+
+        busy_ids = arvl_ids[busy_arvls[inc_pkt_ids[arvl_ids]]]
+        idle_ids = dprt_ids[idle_dprts[inc_pkt_ids[dprt_ids]]]
+
+        srv_changes = np.bincount(busy_ids*srv_num + srv_ids[inc_pkt_ids[busy_ids]], minlength=event_num*srv_num)
+        srv_changes -= np.bincount(idle_ids*srv_num + srv_ids[inc_pkt_ids[idle_ids]], minlength=event_num*srv_num)
+        srv_BUSYs = srv_changes.reshape(event_num, srv_num).cumsum(axis=0)
+        srv_BUSYs += srv_busys
+
+        yield event_lo, (event_times, event_types, inc_pkt_ids, sys_states, q_LENs, srv_BUSYs.astype(np.int8))
+
+        sys_state, q_lens, srv_busys = sys_states[-1], q_LENs[-1], srv_BUSYs[-1]
+        arvl_lo, dprt_lo, event_lo = arvl_hi, dprt_hi, event_lo + event_num
+# End of function `iter_system_events`
@@ -0,0 +1,83 @@
+'''
+File name: test_fifo_queue.py
+'''
+
+import numpy as np
+import pytest
+from fifo_queue import *
+
+def compute_waits_reference(iats, srv_durs, q_cap):
+    '''
+    The loop `mm1.MM1_Sim.compute_departure_times` ran before `fifo_queue`:
+    the backlog kept as cumulative service durations, rebuilt with `np.insert`
+    for every admitted packet, the queue length found with `np.argmax`
+    '''
+    t_wait, t_sojrn = 0., 0.
+    waits = []
+
+    if q_cap == np.inf:
+        for pkt_id in range(len(iats)):
+            t_wait = max(0., t_sojrn - iats[pkt_id])
+            t_sojrn = t_wait + srv_durs[pkt_id]
+            waits.append(t_wait)
+
+    else:
+        cum_backlog_srv_durs = np.array([0.])
+        for pkt_id in range(len(iats)):
+            t_wait = max(0., t_sojrn - iats[pkt_id])
+            q_len = np.argmax(t_wait <= cum_backlog_srv_durs)
+
+            if q_len < q_cap:
+                srv_dur = srv_durs[pkt_id]
+                t_sojrn = t_wait + srv_dur
+                cum_backlog_srv_durs = np.insert(cum_backlog_srv_durs[:q_len+1] + srv_dur, 0, srv_dur)
+                waits.append(t_wait)
+
+            else:
+                t_sojrn = t_wait
+                waits.append(np.inf)
+
+    return np.asarray(waits)
+# End of function `compute_waits_reference`
+
+def draw_packets(seed, rho, pkt_num=5000, mean_iat=1E-3):
+    rng = np.random.default_rng(seed)
+    iats = rng.exponential(mean_iat, pkt_num)
+    srv_durs = rng.exponential(rho*mean_iat, pkt_num)
+
+    return iats.cumsum(), iats, srv_durs
+# End of function `draw_packets`
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('rho', [.5, .9, 1.5])
+@pytest.mark.parametrize('q_cap', [0, 1, 3, 10, np.inf])
+def test_fifo_waits_match_reference(seed, rho, q_cap):
+    arvl_times, iats, srv_durs = draw_packets(seed, rho)
+
+    waits = compute_fifo_waits(arvl_times, iats, srv_durs, q_cap)
+    ref_waits = compute_waits_reference(iats, srv_durs, q_cap)
+
+    # Same packets dropped, same waits for the others
+    np.testing.assert_array_equal(np.isinf(waits), np.isinf(ref_waits))
+    np.testing.assert_allclose(waits[np.isfinite(waits)], ref_waits[np.isfinite(ref_waits)], rtol=1E-9, atol=1E-12)
+# End of function `test_fifo_waits_match_reference`
+
+def test_unlimited_waits_across_chunks():
+    # Several chunks of the unrolled recursion, each restarting its sums
+    arvl_times, iats, srv_durs = draw_packets(0, .95, pkt_num=3*(1<<16) + 5)
+
+    np.testing.assert_allclose(compute_fifo_waits(arvl_times, iats, srv_durs),
+                                compute_waits_reference(iats, srv_durs, np.inf), rtol=1E-9, atol=1E-12)
+# End of function `test_unlimited_waits_across_chunks`
+
+@pytest.mark.parametrize('q_cap', [1, 3, 10, np.inf])
+def test_one_server_of_many_matches_fifo(q_cap):
+    # With one server the multi-server queue is the plain FIFO queue, except
+    # at q_cap=0 where the single-server loop has always admitted nobody
+    arvl_times, iats, srv_durs = draw_packets(0, 1.2)
+
+    waits, srv_ids = compute_multi_server_waits(arvl_times, srv_durs[None, :], q_cap)
+
+    np.testing.assert_allclose(waits, compute_waits_reference(iats, srv_durs, q_cap), rtol=1E-9, atol=1E-12)
+    assert not srv_ids.any()
+# End of function `test_one_server_of_many_matches_fifo`
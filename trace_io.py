@@ -0,0 +1,175 @@
+'''
+File name: trace_io.py
+'''
+
+import os, json, shutil, struct
+import numpy as np
+import pandas as pd
+
+__all__ = ['TRACE_FMTs', 'TraceWriter', 'write_trace', 'read_trace']
+
+# 'npy': one memory-mappable .npy per column plus a JSON manifest
+# 'parquet': needs pyarrow
+# 'csv': human-readable, slowest
+TRACE_FMTs = ('npy', 'parquet', 'csv')
+
+# Pick the format of newly written traces with e.g. SIMTRACE_FORMAT=csv
+trace_fmt = os.environ.get('SIMTRACE_FORMAT', 'npy')
+
+MANIFEST = 'manifest.json'
+
+# Fixed .npy header size, so the final row count can be patched in place
+NPY_HEADER_LEN = 128
+
+class TraceWriter:
+    '''
+    Trace table at `path` (without extension) written batch by batch,
+    so only the current batch ever needs to be in memory.
+    Text columns are stored as categorical codes, their categories are fixed
+    by the first batch.
+    '''
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or trace_fmt
+        self.row_num = 0
+        self.col_specs, self.files = None, []
+        self.pa_writer = None
+
+        if self.fmt not in TRACE_FMTs:
+            raise ValueError(f'Error!!! Unknown trace format "{self.fmt}", expected one of {TRACE_FMTs}.')
+
+        # Drop the same table stored in other formats, so readers don't pick stale data
+        remove_trace(path)
+
+        if self.fmt == 'npy': os.mkdir(path)
+    # End of class constructor
+
+    def write(self, df):
+        '''
+        Append the rows of `df`, index included
+        '''
+        df = to_categorical(df.reset_index())
+
+        if self.fmt == 'csv':
+            df.to_csv(self.path + '.csv', mode='a', header=self.row_num==0, index=False)
+
+        elif self.fmt == 'parquet':
+            import pyarrow as pa, pyarrow.parquet as pa_pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.pa_writer is None:
+                self.pa_writer = pa_pq.ParquetWriter(self.path + '.parquet', table.schema)
+            self.pa_writer.write_table(table)
+
+        else:
+            if self.col_specs is None: self.open_columns(df)
+
+            for spec, file, (name, col) in zip(self.col_specs, self.files, df.items()):
+                if 'categories' in spec:
+                    vals = col.cat.set_categories(spec['categories']).cat.codes.to_numpy()
+                else: vals = col.to_numpy()
+
+                file.write(np.ascontiguousarray(vals, spec['dtype']).tobytes())
+
+        self.row_num += len(df)
+    # End of method `write`
+
+    def open_columns(self, df):
+        self.col_specs, self.files = [], []
+
+        for col_id, (name, col) in enumerate(df.items()):
+            spec = {'name': name, 'file': f'col{col_id}.npy'}
+
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                spec['categories'] = col.cat.categories.tolist()
+                spec['dtype'] = col.cat.codes.dtype
+            else: spec['dtype'] = col.to_numpy().dtype
+
+            file = open(os.path.join(self.path, spec['file']), 'wb')
+            file.write(get_npy_header(spec['dtype'], 0))
+
+            self.col_specs.append(spec)
+            self.files.append(file)
+    # End of method `open_columns`
+
+    def close(self):
+        if self.fmt == 'csv':
+            # Nothing written yet, leave at least an empty file behind
+            if self.row_num == 0: open(self.path + '.csv', 'w').close()
+
+        elif self.fmt == 'parquet':
+            if self.pa_writer is not None: self.pa_writer.close()
+
+        else:
+            for spec, file in zip(self.col_specs or [], self.files):
+                # Now that the length is known, patch it into the header
+                file.seek(0)
+                file.write(get_npy_header(spec['dtype'], self.row_num))
+                file.close()
+
+                spec['dtype'] = spec['dtype'].str
+
+            with open(os.path.join(self.path, MANIFEST), 'w') as file:
+                json.dump({'format': 'npy', 'rows': self.row_num, 'columns': self.col_specs or []}, file, indent=1)
+
+        return self.path
+    # End of method `close`
+
+def get_npy_header(dtype, length):
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': (length,)})
+    header = header.ljust(NPY_HEADER_LEN - 11) + '\n'
+
+    # Magic string, format version 1.0, header length
+    return np.lib.format.MAGIC_PREFIX + bytes((1, 0)) + struct.pack('<H', len(header)) + header.encode('latin1')
+# End of function `get_npy_header`
+
+def write_trace(df, path, fmt=None):
+    '''
+    Store a whole trace table at `path` (without extension), index included
+    '''
+    writer = TraceWriter(path, fmt)
+    writer.write(df)
+    return writer.close()
+# End of function `write_trace`
+
+def read_trace(path, mmap=True):
+    '''
+    Load a trace table written by `write_trace`, whatever its format
+    '''
+    if os.path.exists(manifest_path:=os.path.join(path, MANIFEST)):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+        cols = {}
+        for spec in manifest['columns']:
+            vals = np.load(os.path.join(path, spec['file']), mmap_mode='r' if mmap else None)
+
+            if 'categories' in spec:
+                vals = pd.Categorical.from_codes(vals, spec['categories'])
+
+            cols[spec['name']] = vals
+
+        return pd.DataFrame(cols, copy=False)
+
+    if os.path.exists(path + '.parquet'):
+        return pd.read_parquet(path + '.parquet')
+
+    return pd.read_csv(path + '.csv')
+# End of function `read_trace`
+
+def remove_trace(path):
+    if os.path.isdir(path): shutil.rmtree(path)
+
+    for ext in ('.parquet', '.csv'):
+        if os.path.exists(path + ext): os.remove(path + ext)
+# End of function `remove_trace`
+
+def to_categorical(df):
+    '''
+    Text columns --> categorical, so only small integer codes are stored
+    '''
+    txt_cols = [name for name, col in df.items()
+                    if not isinstance(col.dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(col.dtype)]
+    return df.astype({name: 'category' for name in txt_cols}) if txt_cols else df
+# End of function `to_categorical`
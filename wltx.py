@@ -9,60 +9,89 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from collections.abc import Iterable
 from aux_.pyaux import *
+from trace_io import *
 from student.implement import *
+from arrivals import *
+from fifo_queue import *
+from channel import *
 import numpy as np
 import pandas as pd
 __all__ = []
 rng = np.random.default_rng()
 
+# Without Numba ARQ over a channel runs as a plain Python loop
+try:
+    from numba import njit
+except ImportError:
+    njit = lambda **kwargs: (lambda func: func)
+
 def main():
         # Feel free to modify the parameter "sim_time_limit".
     sim_time_limit           = 60        # seconds
     mean_inter_arrival_time  =     # seconds
     mean_pkt_size            =     # Bytes
-    bit_error_probability    = 
+    bit_error_probability    =           # or a list of them, or channels, e.g. GilbertElliott(bep_good, bep_bad, mean_good, mean_bad)
+    arq                      = None      # None, 'sw' (stop-and-wait) or 'sr' (selective repeat)
+    link_rate                = None      # bps, needed for ARQ
+    round_trip_time          = 0.        # seconds
+    max_attempts             = 7
 
     simulator = WlTx_Sim(t_limit=sim_time_limit,
                         mean_iat=mean_inter_arrival_time,
                         mean_pkt_size=mean_pkt_size,
-                        beps=bit_error_probability)
+                        beps=bit_error_probability,
+                        arq=arq,
+                        link_rate=link_rate,
+                        rtt=round_trip_time,
+                        max_attempts=max_attempts)
 
     simulator.simulate()
 # End of function `main`
 
 class WlTx_Sim:
+    # Store-and-forward errors drawn bit by bit (`generate_faulty_packets`), or,
+    # if False, by skipping from error to error: the work then grows with the
+    # number of errors rather than of bits, far less at realistic BEPs
+    per_bit_errors = True
 
-    def simulate(self):
+    def simulate(self, interactive=True):
         print('Simulation has started.')
         self.generate_packets()
         self.compute_faulty()
+        if self.arq: self.compute_retransmissions()
         self.save_simulation_results()
-        input('\nPress <Enter> to finish.\n')
+        if interactive: input('\nPress <Enter> to finish.\n')
     # End of method `simulate`
 
-    def __init__(self, t_limit, mean_iat, mean_pkt_size, beps):
+    def run(self):
+        '''
+        One replication without traces or prompts, returns its summary statistics
+        '''
+        self.generate_packets()
+        self.compute_faulty()
+        if self.arq: self.compute_retransmissions()
+        return self.compute_summary()
+    # End of method `run`
+
+    def __init__(self, t_limit, mean_iat, mean_pkt_size, beps, arq=None, link_rate=None, rtt=0., max_attempts=7):
         self.t_limit = t_limit
         self.mean_iat = mean_iat
         self.mean_pkt_size = mean_pkt_size
         if isinstance(beps, Iterable): self.beps = beps
         else: self.beps = [beps]
         self.run_num = len(self.beps)
+        self.arq = arq
+        self.link_rate = link_rate
+        self.rtt = rtt
+        self.max_attempts = max_attempts
+
+        assert arq in (None, 'sw', 'sr'), f"Error!!! Unknown ARQ '{arq}', expected None, 'sw' or 'sr'."
+        assert arq is None or link_rate, 'Error!!! ARQ needs the link rate.'
     # End of class constructor
 
     def generate_packets(self):
-        # Pre-estimate number of arrivals
-        lamb = self.t_limit*self.run_num/self.mean_iat
-            # 3.29 below is just a heuristic number
-        arvl_num = np.ceil(lamb + 3.29*lamb**.5).astype(np.int0)
-
-        iats = generate_rand_iats_in_sec(self.mean_iat, arvl_num)
-        while iats.sum() < self.t_limit:
-            iats = np.concatenate((iats, generate_rand_iats_in_sec(self.mean_iat, arvl_num)))
-
-        arvl_times = iats.cumsum()
-
-        self.iats = iats[(msk:= arvl_times<=self.t_limit*self.run_num)]
-        self.arvl_times = arvl_times[msk]
+        # Arrivals of all runs back to back
+        self.iats, self.arvl_times = generate_arrivals(self.mean_iat, self.t_limit*self.run_num)
 
         # How many packets are generated?
         pkt_num = len(self.arvl_times)
@@ -80,31 +109,182 @@ class WlTx_Sim:
     # End of method `generate_arrival_times`
 
     def compute_faulty(self):
-        bins = np.arange(0, self.arvl_times[-1] + self.t_limit, self.t_limit)
-        run_ids = np.digitize(self.arvl_times, bins, right=True) - 1
-
-        faultys1, faultys2 = np.zeros((2, self.pkt_num), bool)
-        t_last = 0.
-        for run, bep in enumerate(self.beps):
-            filt = (run_ids==run)
-            pkt_num = filt.sum()
-            pkt_sizes_in_byte = self.pkt_sizes[filt]
-            
-            # Which packets are faulty and which are not?
-            if bep > 0:
-                faulty1 = (rng.geometric(bep, pkt_num) <= pkt_sizes_in_byte*8)
-                faulty2 = generate_faulty_packets(bep, pkt_num, pkt_sizes_in_byte.astype(np.int0))
-
-                faultys1[filt], faultys2[filt] = faulty1, faulty2
-
-            self.arvl_times[filt] -= t_last
-            t_last += self.arvl_times[filt][-1]
+        # Runs are back to back, run r covers (r*t_limit, (r + 1)*t_limit]: sorted
+        # arrivals make every run a slice, bounded where the next one starts
+        run_bounds = np.searchsorted(self.arvl_times, np.arange(self.run_num + 1)*self.t_limit, 'right')
+        run_pkt_nums = np.diff(run_bounds)
+
+        # Nominal BEP of every run, the time average for a channel
+        run_BEPs = [bep.mean_bep if isinstance(bep, MarkovChannel) else bep for bep in self.beps]
+        ag_beps = np.repeat(np.asarray(run_BEPs, float), run_pkt_nums)
+
+        # BEP every packet sees: that of its run, or that of the channel state it arrives in
+        pkt_beps = ag_beps.copy()
+        ch_states = np.zeros(self.pkt_num, np.int8)
+        ch_SOJOURNs = {}
+
+        for run, (channel, lo, hi) in enumerate(zip(self.beps, run_bounds[:-1], run_bounds[1:])):
+            if not isinstance(channel, MarkovChannel): continue
+
+            # Kept for the retransmissions, which see the channel later on
+            t_starts, states = ch_SOJOURNs[run] = channel.draw_sojourns(self.t_limit, rng)
+
+            ch_states[lo:hi] = states[np.searchsorted(t_starts, self.arvl_times[lo:hi] - run*self.t_limit, 'right') - 1]
+            pkt_beps[lo:hi] = channel.BEPs[ch_states[lo:hi]]
+
+        # Which packets are faulty and which are not? First error positions of
+        # all runs in one draw, each packet with its own BEP
+        faultys1 = np.zeros(self.pkt_num, bool)
+        err_msk = pkt_beps > 0
+        faultys1[err_msk] = rng.geometric(pkt_beps[err_msk]) <= self.pkt_sizes[err_msk]*8
+
+        faultys2 = np.zeros(self.pkt_num, bool)
+        for bep, lo, hi in zip(self.beps, run_bounds[:-1], run_bounds[1:]):
+            if not isinstance(bep, MarkovChannel):
+                if bep > 0 and hi > lo: faultys2[lo:hi] = self.draw_faulty_strforw(bep, self.pkt_sizes[lo:hi])
+                continue
+
+            # Given the states, bits still fail independently: one draw per state
+            for state, state_bep in enumerate(bep.BEPs):
+                pkt_ids = lo + np.flatnonzero(ch_states[lo:hi] == state)
+                if state_bep > 0 and len(pkt_ids): faultys2[pkt_ids] = self.draw_faulty_strforw(state_bep, self.pkt_sizes[pkt_ids])
+
+        # Every run starts over from the last arrival before it
+        t_lasts = np.where(run_bounds[:-1] > 0, self.arvl_times[np.maximum(run_bounds[:-1] - 1, 0)], 0.)
+        self.arvl_times -= np.repeat(t_lasts, run_pkt_nums)
 
         self.faultys1 = faultys1
         self.faultys2 = faultys2
-        self.ag_beps = np.asarray(self.beps)[run_ids]
+        self.ag_beps = ag_beps
+        self.run_ids = np.repeat(np.arange(self.run_num, dtype=np.int16), run_pkt_nums)
+        self.pkt_beps = pkt_beps
+        self.ch_states = ch_states
+        self.ch_SOJOURNs = ch_SOJOURNs
+        self.ch_HORIZONs = dict.fromkeys(ch_SOJOURNs, float(self.t_limit))
+        self.run_bounds = run_bounds
+        self.t_lasts = t_lasts
     # End of method `compute_system_events`
 
+    def compute_retransmissions(self):
+        '''
+        ARQ on top of the fast method: a faulty packet is sent again a round
+        trip after its last attempt, up to `max_attempts` times, attempt k
+        leaving k*(tx + rtt) after the packet gets the sender. Stop-and-wait
+        holds the sender until the acknowledgement, selective repeat only
+        takes link time per attempt (the receiver's reordering is not
+        modelled). Over a channel every attempt sees the state at the time
+        it is really sent, queueing included.
+        '''
+        tx_durs = self.pkt_sizes*8./self.link_rate
+        retx_gaps = tx_durs + self.rtt
+        hold_gaps = retx_gaps if self.arq == 'sw' else tx_durs
+
+        attempts = np.ones(self.pkt_num, np.int16)
+        delivered = np.ones(self.pkt_num, bool)
+        waits = np.empty(self.pkt_num)
+
+        # At a fixed BEP attempts don't depend on when they are sent: every
+        # round re-draws the first error positions of the packets still
+        # failing, all in one go
+        ch_msk = np.zeros(self.pkt_num, bool)
+        for run in self.ch_SOJOURNs: ch_msk[self.run_bounds[run]:self.run_bounds[run+1]] = True
+        fail_pkt_ids = np.flatnonzero(self.faultys1 & ~ch_msk)
+
+        for attempt in range(1, self.max_attempts):
+            if not len(fail_pkt_ids): break
+            attempts[fail_pkt_ids] += 1
+
+            faultys = rng.geometric(self.pkt_beps[fail_pkt_ids]) <= self.pkt_sizes[fail_pkt_ids]*8
+            fail_pkt_ids = fail_pkt_ids[faultys]
+
+        delivered[fail_pkt_ids] = False
+
+        # Runs queue up independently
+        for run, (lo, hi) in enumerate(zip(self.run_bounds[:-1], self.run_bounds[1:])):
+            if hi == lo: continue
+
+            if run in self.ch_SOJOURNs: self.send_over_channel(run, retx_gaps, hold_gaps, attempts, delivered, waits)
+            else: waits[lo:hi] = compute_fifo_waits(self.arvl_times[lo:hi], self.iats[lo:hi], attempts[lo:hi]*hold_gaps[lo:hi])
+
+        # When its last attempt reaches the receiver
+        if self.arq == 'sw': tx_delays = (attempts - 1)*retx_gaps + tx_durs + self.rtt/2.
+        else: tx_delays = attempts*tx_durs + (attempts - .5)*self.rtt
+
+        delays = waits + tx_delays
+        delays[~delivered] = np.inf
+
+        self.attempts = attempts
+        self.arq_delivered = delivered
+        self.arq_delays = delays
+    # End of method `compute_retransmissions`
+
+    def send_over_channel(self, run, retx_gaps, hold_gaps, attempts, delivered, waits):
+        '''
+        Fill in `attempts`, `delivered` and `waits` of the packets of a
+        channel `run`, one packet after the other, the channel drawn further
+        on as the attempts go past what is drawn of it
+        '''
+        channel, lo, hi = self.beps[run], self.run_bounds[run], self.run_bounds[run+1]
+
+        # Back on the clock of the run's channel
+        ch_arvl_times = self.arvl_times[lo:hi] + (self.t_lasts[run] - run*self.t_limit)
+        uniforms = rng.random(hi - lo)
+        pkt_id, t_free, u_id = 0, 0., 0
+
+        while True:
+            t_starts, states = self.ch_SOJOURNs[run]
+            pkt_id, t_free, u_id = send_attempts(ch_arvl_times, retx_gaps[lo:hi], hold_gaps[lo:hi], self.pkt_sizes[lo:hi]*8,
+                                                self.faultys1[lo:hi], self.pkt_beps[lo:hi], t_starts, channel.BEPs[states],
+                                                self.ch_HORIZONs[run], uniforms, self.max_attempts, pkt_id, t_free, u_id,
+                                                attempts[lo:hi], delivered[lo:hi], waits[lo:hi])
+            if pkt_id == hi - lo: break
+
+            # Out of uniforms, or else past what is drawn of the channel
+            if len(uniforms) - u_id < self.max_attempts:
+                uniforms, u_id = np.hstack((uniforms[u_id:], rng.random(hi - lo))), 0
+            else:
+                t_horizon = self.ch_HORIZONs[run] + self.t_limit
+                self.ch_SOJOURNs[run] = channel.draw_sojourns(t_horizon, rng, self.ch_SOJOURNs[run], self.ch_HORIZONs[run])
+                self.ch_HORIZONs[run] = t_horizon
+    # End of method `send_over_channel`
+
+    def draw_faulty_strforw(self, bep, pkt_sizes):
+        if self.per_bit_errors: return generate_faulty_packets(bep, len(pkt_sizes), pkt_sizes.astype(np.int0))
+
+        return draw_faulty_by_gaps(bep, pkt_sizes)
+    # End of method `draw_faulty_strforw`
+
+    def compute_summary(self):
+        '''
+        Packet loss rate and goodput of both methods, per run (bit error probability or channel)
+        '''
+        summary = {}
+        for label, lo, hi in zip(self.get_run_labels(), self.run_bounds[:-1], self.run_bounds[1:]):
+            for method, faultys in (('fast', self.faultys1[lo:hi]), ('strforw', self.faultys2[lo:hi])):
+                summary[f'loss rate {method} @ {label}'] = faultys.mean()
+                summary[f'goodput {method} (bps) @ {label}'] = 8.*self.pkt_sizes[lo:hi][~faultys].sum()/self.t_limit
+
+            if not self.arq: continue
+
+            # Only what is delivered by the end of the run counts
+            in_time = self.arvl_times[lo:hi] + self.arq_delays[lo:hi] <= self.t_limit
+            summary[f'loss rate arq @ {label}'] = 1. - self.arq_delivered[lo:hi].mean()
+            summary[f'goodput arq (bps) @ {label}'] = 8.*self.pkt_sizes[lo:hi][in_time].sum()/self.t_limit
+            summary[f'mean attempts @ {label}'] = self.attempts[lo:hi].mean()
+            summary[f'mean delay arq (ms) @ {label}'] = 1000.*self.arq_delays[lo:hi][self.arq_delivered[lo:hi]].mean()
+
+        return summary
+    # End of method `compute_summary`
+
+    def get_run_labels(self):
+        '''
+        One label per run, its BEP or channel, numbered where runs would look
+        alike (e.g. two channels of the same mean BEP)
+        '''
+        labels = [repr(bep) if isinstance(bep, MarkovChannel) else f'bep={bep:g}' for bep in self.beps]
+        return [f'{label} #{run}' if labels.count(label) > 1 else label for run, label in enumerate(labels)]
+    # End of method `get_run_labels`
+
     def save_simulation_results(self):
         print('\nSaving simulation trace... ', end='', flush=True)
 
@@ -114,16 +294,23 @@ class WlTx_Sim:
         except FileExistsError: pass
 
         # Store packet list
+        # Runs are told apart by 'run', 'bep' only holds their nominal BEPs
         pkt_df = pd.DataFrame({ 'packet id': np.arange(self.pkt_num),
+                                'run': pd.Categorical.from_codes(self.run_ids, self.get_run_labels()),
                                 'bep': self.ag_beps,
                                 'size (bytes)': self.pkt_sizes,
                                 'arrive (s)': self.arvl_times,
                                 'faulty fast': self.faultys1,
-                                'faulty strforw': self.faultys2}).set_index('packet id')
+                                'faulty strforw': self.faultys2,
+                                'channel state': self.ch_states}).set_index('packet id')
+
+        if self.arq:
+            pkt_df['attempts'] = self.attempts
+            pkt_df['delay (ms)'] = self.arq_delays*1000.
 
-        file_path = os.path.join(trace_dir, 'packets.csv')
+        file_path = os.path.join(trace_dir, 'packets')
 
-        try: pkt_df.to_csv(file_path)
+        try: write_trace(pkt_df, file_path)
         except PermissionError as err:
             print(f'\033[1m\033[31m\nError!!! Failed to store simulation trace to "{file_path}".')
             print('Make sure this file is not being opened.\033[0m')
@@ -131,6 +318,63 @@ class WlTx_Sim:
         print('Done!')
     # End of method `save_simulation_results`
 
+@njit(cache=True)
+def send_attempts(arvl_times, retx_gaps, hold_gaps, pkt_bits, faultys1, arvl_beps, t_starts, state_beps, t_horizon,
+                    uniforms, max_attempts, pkt_lo, t_free, u_id, attempts, delivered, waits):
+    '''
+    Packets from `pkt_lo` on through the sender in turn, every attempt at the
+    BEP of the state it goes in. A first attempt at the state of the arrival
+    is the fast method's, other attempts fail by the next of `uniforms`.
+    Returns (pkt_id, t_free, u_id) to carry on from once more uniforms or
+    states past `t_horizon` are needed, pkt_id the packet count when done.
+    '''
+    for pkt_id in range(pkt_lo, len(arvl_times)):
+        t_send = max(arvl_times[pkt_id], t_free)
+        u_lo = u_id
+
+        for attempt in range(max_attempts):
+            t_try = t_send + attempt*retx_gaps[pkt_id]
+            if t_try > t_horizon: return pkt_id, t_free, u_lo
+
+            bep = state_beps[np.searchsorted(t_starts, t_try, 'right') - 1]
+            if attempt == 0 and bep == arvl_beps[pkt_id]: faulty = faultys1[pkt_id]
+            elif u_id == len(uniforms): return pkt_id, t_free, u_lo
+            else:
+                # All bits go through with probability (1 - bep)**bits
+                faulty = uniforms[u_id] < -np.expm1(pkt_bits[pkt_id]*np.log1p(-bep))
+                u_id += 1
+
+            if not faulty: break
+
+        attempts[pkt_id] = attempt + 1
+        delivered[pkt_id] = not faulty
+        waits[pkt_id] = t_send - arvl_times[pkt_id]
+        t_free = t_send + (attempt + 1)*hold_gaps[pkt_id]
+
+    return len(arvl_times), t_free, u_id
+# End of function `send_attempts`
+
+def draw_faulty_by_gaps(bep, pkt_sizes):
+    '''
+    Faulty packets among back-to-back packets of `pkt_sizes` Bytes with
+    independent bit errors: the gaps between errors are geometric, so only
+    the errors are drawn and then located by their packets' end bits
+    '''
+    end_bits = (pkt_sizes*8).astype(np.int64).cumsum()
+    faultys = np.zeros(len(pkt_sizes), bool)
+    err_pos = 0
+
+    while True:
+        # Errors expected in the remaining bits plus 3.29 standard deviations, topped up if short
+        err_num = (end_bits[-1] - err_pos)*bep
+        err_POSs = rng.geometric(bep, int(err_num + 3.29*err_num**.5) + 1).cumsum()
+        err_POSs += err_pos
+
+        faultys[np.searchsorted(end_bits, err_POSs[err_POSs <= end_bits[-1]])] = True
+
+        if (err_pos:=err_POSs[-1]) > end_bits[-1]: return faultys
+# End of function `draw_faulty_by_gaps`
+
 if __name__ == '__main__':
     clscr()
     main()
\ No newline at end of file